@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+# Copyright 2012 litl, LLC. All Rights Reserved.
+
+"""
+Offline rscloud benchmarks, run against the local MockAPI.
+
+Measures throughput and per-call p50/p99 latency of common operations at
+several concurrency levels:
+
+    python benchmarks/bench.py --latency 0.02 --concurrency 1,8,32
+
+Results can be saved with --save, and compared against a saved baseline
+with --baseline; the run fails if any throughput drops by more than
+--tolerance.
+"""
+
+import json
+import optparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..'))
+
+import rscloud
+from rscloud.util import run_concurrently
+
+from mockapi import MockAPI
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    if not values:
+        return None
+    index = min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))
+    return values[index]
+
+
+def measure(func, items, concurrency):
+    """
+    Call func on every item with the given concurrency, returning the
+    throughput and latency stats.
+    """
+    timings = []
+
+    def timed(item):
+        start = time.time()
+        try:
+            return func(item)
+        finally:
+            timings.append(time.time() - start)
+
+    start = time.time()
+    results = run_concurrently(timed, items, concurrency)
+    elapsed = time.time() - start
+    return {'ops': len(items),
+            'errors': len([r for r in results if not r.ok]),
+            'seconds': elapsed,
+            'throughput': len(items) / elapsed,
+            'p50': percentile(timings, 50),
+            'p99': percentile(timings, 99)}
+
+
+def bench_servers_list(rs, api, count, concurrency):
+    return measure(lambda i: rs.servers.list(detail=True, limit=100),
+                   range(count), concurrency)
+
+
+def bench_servers_create(rs, api, count, concurrency):
+    image = api.images.keys()[0]
+    specs = [{'name': 'bench%d' % i, 'imageRef': image, 'flavorRef': 2}
+             for i in range(count)]
+    start = time.time()
+    results = rs.servers.create_many(specs, concurrency=concurrency)
+    elapsed = time.time() - start
+    return {'ops': count,
+            'errors': len([r for r in results if not r.ok]),
+            'seconds': elapsed,
+            'throughput': count / elapsed,
+            'p50': None,
+            'p99': None}
+
+
+def bench_dns_modify(rs, api, count, concurrency):
+    domain_id = list(api.domains)[0]
+    records = rs.domains.records.list(domain_id, limit=count)['records']
+    return measure(lambda rec: rs.domains.records.modify(domain_id, rec['id'],
+                                                         ttl=600),
+                   records, concurrency)
+
+
+# records per add_many call; each call is one operation
+ADD_MANY_BATCH = 100
+
+
+def bench_dns_add_many(rs, api, count, concurrency):
+    domain_id = list(api.domains)[0]
+    batches = [[{'name': 'bulk%d-%d.example.com' % (b, i), 'type': 'A',
+                 'data': '10.1.%d.%d' % (b % 256, i % 256)}
+                for i in range(ADD_MANY_BATCH)]
+               for b in range(count)]
+    return measure(lambda batch: rs.domains.records.add_many(domain_id,
+                                                             batch),
+                   batches, concurrency)
+
+
+BENCHMARKS = [
+    ('servers_list', bench_servers_list),
+    ('servers_create_many', bench_servers_create),
+    ('dns_record_modify', bench_dns_modify),
+    ('dns_add_many', bench_dns_add_many),
+]
+
+
+def compare(results, baseline, tolerance):
+    failed = []
+    for key, stats in results.items():
+        base = baseline.get(key)
+        if base and stats['throughput'] < base['throughput'] * (1 - tolerance):
+            failed.append('%s: %.1f ops/s, baseline %.1f ops/s' %
+                          (key, stats['throughput'], base['throughput']))
+    return failed
+
+
+def main():
+    parser = optparse.OptionParser(usage='%prog [options]')
+    parser.add_option('--latency', type='float', default=0.01,
+                      help='mock API latency in seconds')
+    parser.add_option('--jitter', type='float', default=0.0,
+                      help='random extra mock API latency in seconds')
+    parser.add_option('--error-rate', type='float', default=0.0,
+                      help='fraction of requests failing with a 503')
+    parser.add_option('--requests', type='int', default=200,
+                      help='operations per benchmark')
+    parser.add_option('--concurrency', default='1,8,32',
+                      help='comma separated concurrency levels')
+    parser.add_option('--only', default=None,
+                      help='comma separated benchmark names to run')
+    parser.add_option('--save', default=None,
+                      help='write results to this JSON file')
+    parser.add_option('--baseline', default=None,
+                      help='compare throughput with this JSON file')
+    parser.add_option('--tolerance', type='float', default=0.2,
+                      help='allowed fractional throughput regression')
+    opts, args = parser.parse_args()
+
+    levels = [int(c) for c in opts.concurrency.split(',')]
+    only = opts.only and opts.only.split(',')
+
+    api = MockAPI(latency=opts.latency, jitter=opts.jitter,
+                  error_rate=opts.error_rate, servers=500,
+                  records=opts.requests).start()
+    transport = rscloud.Transport(pool_maxsize=max(levels))
+    rs = rscloud.RackspaceSession('bench', 'key', auth_url=api.auth_url,
+                                  transport=transport).login()
+
+    results = {}
+    print('%-22s %5s %8s %10s %9s %9s %6s' % (
+        'benchmark', 'conc', 'ops', 'ops/s', 'p50 ms', 'p99 ms', 'errors'))
+    for name, func in BENCHMARKS:
+        if only and name not in only:
+            continue
+        for concurrency in levels:
+            stats = func(rs, api, opts.requests, concurrency)
+            results['%s@%d' % (name, concurrency)] = stats
+            ms = lambda v: '-' if v is None else '%.2f' % (v * 1000)
+            print('%-22s %5d %8d %10.1f %9s %9s %6d' % (
+                name, concurrency, stats['ops'], stats['throughput'],
+                ms(stats['p50']), ms(stats['p99']), stats['errors']))
+
+    api.stop()
+
+    if opts.save:
+        with open(opts.save, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if opts.baseline:
+        with open(opts.baseline) as f:
+            failed = compare(results, json.load(f), opts.tolerance)
+        if failed:
+            print('\nthroughput regressions:')
+            for line in failed:
+                print('  ' + line)
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
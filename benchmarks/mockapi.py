@@ -0,0 +1,564 @@
+#!/usr/bin/env python
+# Copyright 2012 litl, LLC. All Rights Reserved.
+
+"""
+A local stand-in for the Rackspace APIs used by rscloud, for benchmarks and
+offline experiments.
+
+Emulates identity /tokens, next-gen and first-gen servers, images and
+flavors, and Cloud DNS with asynchronous job callbacks. Latency, error rate,
+build times and job times are configurable.
+
+    api = MockAPI(latency=0.01, error_rate=0.05).start()
+    rs = rscloud.RackspaceSession('user', 'key', auth_url=api.auth_url)
+"""
+
+import json
+import random
+import re
+import socket
+import threading
+import time
+import uuid
+import zlib
+from datetime import datetime
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+from urlparse import urlparse, parse_qs
+
+TENANT = '123456'
+REGION = 'ORD'
+
+
+def _now():
+    return datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 128
+
+    def __init__(self, *args, **kwargs):
+        HTTPServer.__init__(self, *args, **kwargs)
+        self.connections = set()
+
+    def process_request_thread(self, request, client_address):
+        self.connections.add(request)
+        try:
+            ThreadingMixIn.process_request_thread(self, request,
+                                                  client_address)
+        finally:
+            self.connections.discard(request)
+
+    def close_connections(self):
+        for request in list(self.connections):
+            try:
+                request.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+
+    def handle_error(self, request, client_address):
+        # Only connection errors get here, usually clients dropping
+        # keep-alive connections; handler errors are sent back as a 500.
+        pass
+
+
+class MockAPI(object):
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, jitter=0.0,
+                 error_rate=0.0, build_time=0.0, job_time=0.0,
+                 servers=0, records=0, check_tokens=True, compress=True):
+        """
+        :param latency: seconds added to every response
+        :param jitter: maximum random seconds added to latency
+        :param error_rate: fraction of requests answered with a 503
+        :param build_time: seconds a server stays in BUILD, or in the
+            transitional status of an action such as REBOOT
+        :param job_time: seconds a DNS job stays RUNNING
+        :param servers: number of next-gen servers to start with
+        :param records: number of records in the example.com domain
+        :param check_tokens: answer requests without a token issued by this
+            mock with a 401
+        :param compress: gzip responses of 1KB or more for clients accepting
+            gzip
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.build_time = build_time
+        self.job_time = job_time
+        self.check_tokens = check_tokens
+        self.compress = compress
+
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.logins = 0
+        self.tokens = set()
+        self.servers = {}
+        self.images = dict((str(uuid.uuid4()), {'name': 'image %d' % i,
+                                                'status': 'ACTIVE'})
+                           for i in range(20))
+        self.flavors = dict((str(i), {'name': '%dMB' % (256 << i),
+                                      'ram': 256 << i, 'disk': 10 << i})
+                            for i in range(1, 9))
+        self.domains = {}
+        self.jobs = {}
+
+        for i in range(servers):
+            self._create_server('server%d' % i, self.images.keys()[0], '2',
+                                built=True)
+        domain = self._create_domain('example.com')
+        for i in range(records):
+            self._create_record(domain, {'name': 'host%d.example.com' % i,
+                                         'type': 'A',
+                                         'data': '10.0.%d.%d' % (i // 256,
+                                                                  i % 256)})
+
+        class Handler(_Handler):
+            api = self
+
+        self.httpd = _Server((host, port), Handler)
+        self.url = 'http://%s:%d' % self.httpd.server_address
+        self.auth_url = self.url + '/v2.0'
+        self.servers_url = '%s/v2/%s' % (self.url, TENANT)
+        self.firstgen_url = '%s/v1.0/%s' % (self.url, TENANT)
+        self.dns_url = '%s/dns/v1.0/%s' % (self.url, TENANT)
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def revoke_tokens(self):
+        """
+        Invalidate every token issued so far, as if they had expired
+        """
+        with self.lock:
+            self.tokens.clear()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.close_connections()
+        self.httpd.server_close()
+        # let the handlers of the dropped keep-alive connections finish
+        deadline = time.time() + 1
+        while self.httpd.connections and time.time() < deadline:
+            time.sleep(0.01)
+
+    # state
+
+    def _create_server(self, name, image, flavor, built=False):
+        server_id = str(uuid.uuid4())
+        self.servers[server_id] = {
+            'id': server_id,
+            'name': name,
+            'status': 'ACTIVE' if built else 'BUILD',
+            'progress': 100 if built else 0,
+            'image': {'id': image},
+            'flavor': {'id': flavor},
+            'addresses': {'private': [
+                {'version': 4,
+                 'addr': '10.%d.%d.%d' % (random.randint(0, 255),
+                                          random.randint(0, 255),
+                                          random.randint(1, 254))}]},
+            'metadata': {},
+            'updated': _now(),
+            '_created': time.time(),
+        }
+        return self.servers[server_id]
+
+    def _refresh_server(self, server):
+        if server.get('_settle') is not None:
+            # finish a server action after build_time
+            status, started = server['_settle']
+            if time.time() - started >= self.build_time:
+                server['status'] = status
+                server['_settle'] = None
+                server['updated'] = _now()
+            return
+        if server['status'] != 'BUILD':
+            return
+        elapsed = time.time() - server['_created']
+        if elapsed >= self.build_time:
+            server['status'] = 'ACTIVE'
+            server['progress'] = 100
+        else:
+            server['progress'] = int(100 * elapsed / self.build_time)
+        server['updated'] = _now()
+
+    def _create_domain(self, name):
+        domain_id = len(self.domains) + 1000
+        self.domains[domain_id] = {'id': domain_id, 'name': name,
+                                   'ttl': 300, 'records': {},
+                                   'updated': _now()}
+        return self.domains[domain_id]
+
+    def _create_record(self, domain, record):
+        record = dict(record)
+        record['id'] = '%s-%d' % (record['type'], len(domain['records']) +
+                                  random.randint(0, 1 << 30))
+        record.setdefault('ttl', domain['ttl'])
+        domain['records'][record['id']] = record
+        return record
+
+    def _job(self, response):
+        job_id = str(uuid.uuid4())
+        self.jobs[job_id] = {'jobId': job_id, 'response': response,
+                             '_created': time.time()}
+        return {'jobId': job_id, 'status': 'RUNNING',
+                'callbackUrl': '%s/status/%s' % (self.dns_url, job_id)}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # set on the subclass created for each MockAPI
+    api = None
+
+    protocol_version = 'HTTP/1.1'
+    # buffer each response into a single write, so the client isn't left
+    # waiting on a delayed ack
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    routes = [
+        ('POST', r'^/v2\.0/tokens$', 'tokens'),
+        ('GET', r'^/v2/\w+/servers(/detail)?$', 'list_servers'),
+        ('POST', r'^/v2/\w+/servers$', 'create_server'),
+        ('GET', r'^/v2/\w+/servers/([\w-]+)$', 'get_server'),
+        ('DELETE', r'^/v2/\w+/servers/([\w-]+)$', 'delete_server'),
+        ('POST', r'^/v2/\w+/servers/([\w-]+)/action$', 'server_action'),
+        ('GET', r'^/v2/\w+/images(/detail)?$', 'list_images'),
+        ('GET', r'^/v2/\w+/flavors(/detail)?$', 'list_flavors'),
+        ('GET', r'^/v2/\w+/limits$', 'limits'),
+        ('GET', r'^/v1\.0/\w+/servers(/detail)?$', 'list_servers'),
+        ('GET', r'^/v1\.0/\w+/images(/detail)?$', 'list_images'),
+        ('GET', r'^/dns/v1\.0/\w+/domains$', 'list_domains'),
+        ('GET', r'^/dns/v1\.0/\w+/domains/(\d+)$', 'get_domain'),
+        ('GET', r'^/dns/v1\.0/\w+/domains/(\d+)/export$', 'export_domain'),
+        ('POST', r'^/dns/v1\.0/\w+/domains/import$', 'import_domains'),
+        ('GET', r'^/dns/v1\.0/\w+/domains/(\d+)/records$', 'list_records'),
+        ('POST', r'^/dns/v1\.0/\w+/domains/(\d+)/records$', 'add_records'),
+        ('PUT', r'^/dns/v1\.0/\w+/domains/(\d+)/records$',
+         'modify_records'),
+        ('PUT', r'^/dns/v1\.0/\w+/domains/(\d+)/records/([\w-]+)$',
+         'modify_record'),
+        ('DELETE', r'^/dns/v1\.0/\w+/domains/(\d+)/records$',
+         'remove_records'),
+        ('DELETE', r'^/dns/v1\.0/\w+/domains/(\d+)/records/([\w-]+)$',
+         'remove_record'),
+        ('GET', r'^/dns/v1\.0/\w+/status/([\w-]+)$', 'job_status'),
+    ]
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def do_PUT(self):
+        self._dispatch('PUT')
+
+    def do_DELETE(self):
+        self._dispatch('DELETE')
+
+    def _dispatch(self, method):
+        api = self.api
+        parsed = urlparse(self.path)
+        self.query = parse_qs(parsed.query)
+        length = int(self.headers.get('content-length') or 0)
+        self.body = None
+        if length:
+            data = self.rfile.read(length)
+            if self.headers.get('content-encoding') == 'gzip':
+                data = zlib.decompress(data, 16 + zlib.MAX_WBITS)
+            self.body = json.loads(data)
+
+        delay = api.latency + random.uniform(0, api.jitter)
+        if delay:
+            time.sleep(delay)
+
+        with api.lock:
+            api.requests += 1
+            if (api.error_rate and not parsed.path.endswith('/tokens') and
+                    random.random() < api.error_rate):
+                return self._send(503, {'serviceUnavailable': {
+                    'code': 503, 'message': 'injected error'}})
+
+            if (api.check_tokens and not parsed.path.endswith('/tokens') and
+                    self.headers.get('x-auth-token') not in api.tokens):
+                return self._send(401, {'unauthorized': {
+                    'code': 401, 'message': 'invalid token'}})
+
+            for route_method, pattern, name in self.routes:
+                match = re.match(pattern, parsed.path)
+                if route_method == method and match:
+                    try:
+                        status, body = getattr(self, name)(*match.groups())
+                    except Exception as err:
+                        status, body = 500, {'computeFault': {
+                            'code': 500, 'message': repr(err)}}
+                    return self._send(status, body)
+        self._send(404, {'itemNotFound': {'code': 404}})
+
+    def _send(self, status, body):
+        data = json.dumps(body) if body is not None else ''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        if (self.api.compress and len(data) >= 1024 and
+                'gzip' in self.headers.get('accept-encoding', '')):
+            compressor = zlib.compressobj(6, zlib.DEFLATED,
+                                          16 + zlib.MAX_WBITS)
+            data = compressor.compress(data) + compressor.flush()
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _arg(self, name, default=None):
+        return self.query.get(name, [default])[0]
+
+    def _page(self, items):
+        # marker/limit pagination over items sorted by id
+        items = sorted(items, key=lambda item: item['id'])
+        marker = self._arg('marker')
+        if marker:
+            items = [item for item in items if item['id'] > marker]
+        limit = self._arg('limit')
+        if limit:
+            items = items[:int(limit)]
+        return items
+
+    # identity
+
+    def tokens(self):
+        api = self.api
+        expires = datetime.utcfromtimestamp(time.time() + 86400)
+        token = str(uuid.uuid4())
+        api.logins += 1
+        api.tokens.add(token)
+        return 200, {'access': {
+            'token': {'id': token,
+                      'expires': expires.strftime('%Y-%m-%dT%H:%M:%S.000Z')},
+            'user': {'id': TENANT, 'name': 'mock',
+                     'RAX-AUTH:defaultRegion': REGION},
+            'serviceCatalog': [
+                {'name': 'cloudServersOpenStack', 'type': 'compute',
+                 'endpoints': [{'region': REGION, 'tenantId': TENANT,
+                                'publicURL': api.servers_url}]},
+                {'name': 'cloudServers', 'type': 'compute',
+                 'endpoints': [{'tenantId': TENANT,
+                                'publicURL': api.firstgen_url}]},
+                {'name': 'cloudDNS', 'type': 'rax:dns',
+                 'endpoints': [{'tenantId': TENANT,
+                                'publicURL': api.dns_url}]},
+            ]}}
+
+    # servers
+
+    def list_servers(self, detail):
+        api = self.api
+        servers = list(api.servers.values())
+        for server in servers:
+            api._refresh_server(server)
+        since = self._arg('changes-since')
+        if since:
+            servers = [s for s in servers if s['updated'] >= since]
+        else:
+            servers = [s for s in servers if s['status'] != 'DELETED']
+        status = self._arg('status')
+        if status:
+            servers = [s for s in servers if s['status'] == status]
+        servers = self._page(servers)
+        if detail:
+            servers = [dict((k, v) for k, v in s.items()
+                            if not k.startswith('_')) for s in servers]
+        else:
+            servers = [{'id': s['id'], 'name': s['name']} for s in servers]
+        return 200, {'servers': servers}
+
+    def create_server(self):
+        req = self.body['server']
+        server = self.api._create_server(req['name'], req['imageRef'],
+                                         req['flavorRef'])
+        if not self.api.build_time:
+            self.api._refresh_server(server)
+        return 202, {'server': {'id': server['id'],
+                                'adminPass': uuid.uuid4().hex[:12]}}
+
+    def get_server(self, server_id):
+        server = self.api.servers.get(server_id)
+        if server is None or server['status'] == 'DELETED':
+            return 404, {'itemNotFound': {'code': 404}}
+        self.api._refresh_server(server)
+        return 200, {'server': dict((k, v) for k, v in server.items()
+                                    if not k.startswith('_'))}
+
+    def delete_server(self, server_id):
+        server = self.api.servers.get(server_id)
+        if server is None:
+            return 404, {'itemNotFound': {'code': 404}}
+        server['status'] = 'DELETED'
+        server['updated'] = _now()
+        return 204, None
+
+    # (transitional status, final status) of each server action
+    actions = {
+        'reboot': ('REBOOT', 'ACTIVE'),
+        'rebuild': ('REBUILD', 'ACTIVE'),
+        'resize': ('RESIZE', 'VERIFY_RESIZE'),
+        'confirmResize': ('ACTIVE', 'ACTIVE'),
+        'revertResize': ('REVERT_RESIZE', 'ACTIVE'),
+        'rescue': ('RESCUE', 'RESCUE'),
+        'unrescue': ('ACTIVE', 'ACTIVE'),
+        'changePassword': ('PASSWORD', 'ACTIVE'),
+        'createImage': (None, None),
+    }
+
+    def server_action(self, server_id):
+        server = self.api.servers.get(server_id)
+        if server is None or server['status'] == 'DELETED':
+            return 404, {'itemNotFound': {'code': 404}}
+        action = list(self.body)[0]
+        if action not in self.actions:
+            return 400, {'badRequest': {'code': 400,
+                                        'message': 'unknown action'}}
+        transitional, final = self.actions[action]
+        if transitional is not None:
+            if action == 'reboot' and self.body[action]['type'] == 'HARD':
+                transitional = 'HARD_REBOOT'
+            server['status'] = transitional
+            server['_settle'] = (final, time.time())
+            if not self.api.build_time:
+                self.api._refresh_server(server)
+        server['updated'] = _now()
+        return 202, None
+
+    def list_images(self, detail):
+        images = [dict(image, id=image_id)
+                  for image_id, image in self.api.images.items()]
+        return 200, {'images': self._page(images)}
+
+    def list_flavors(self, detail):
+        flavors = [dict(flavor, id=flavor_id)
+                   for flavor_id, flavor in self.api.flavors.items()]
+        return 200, {'flavors': self._page(flavors)}
+
+    def limits(self):
+        return 200, {'limits': {'rate': [
+            {'uri': '*', 'regex': '.*', 'limit': [
+                {'verb': verb, 'value': 10000, 'remaining': 10000,
+                 'unit': 'MINUTE'}
+                for verb in ('GET', 'POST', 'PUT', 'DELETE')]}],
+            'absolute': {}}}
+
+    # dns
+
+    def _domain_json(self, domain):
+        return {'id': domain['id'], 'name': domain['name'],
+                'ttl': domain['ttl'], 'updated': domain['updated']}
+
+    def list_domains(self):
+        domains = [self._domain_json(d) for d in self.api.domains.values()]
+        name = self._arg('name')
+        if name:
+            domains = [d for d in domains if d['name'] == name]
+        return 200, {'domains': domains, 'totalEntries': len(domains)}
+
+    def get_domain(self, domain_id):
+        domain = self.api.domains.get(int(domain_id))
+        if domain is None:
+            return 404, {'itemNotFound': {'code': 404}}
+        body = self._domain_json(domain)
+        if self._arg('showRecords', 'true') == 'true':
+            body['recordsList'] = {
+                'records': list(domain['records'].values()),
+                'totalEntries': len(domain['records'])}
+        return 200, body
+
+    def export_domain(self, domain_id):
+        domain = self.api.domains.get(int(domain_id))
+        if domain is None:
+            return 404, {'itemNotFound': {'code': 404}}
+        lines = ['%s.\t%d\tIN\tSOA\tns.example.com. admin.%s. 1 3600 '
+                 '300 1814400 300' % (domain['name'], domain['ttl'],
+                                      domain['name'])]
+        for record in sorted(domain['records'].values(),
+                             key=lambda r: r['id']):
+            lines.append('%s.\t%d\tIN\t%s\t%s' % (
+                record['name'], record['ttl'], record['type'],
+                record['data']))
+        return 202, self.api._job({'id': domain['id'],
+                                   'accountId': TENANT,
+                                   'contentType': 'BIND_9',
+                                   'contents': '\n'.join(lines) + '\n'})
+
+    def import_domains(self):
+        imported = []
+        for zone in self.body['domains']:
+            entries = [line.split('\t') for line in
+                       zone['contents'].splitlines() if line.strip()]
+            soa = [e for e in entries if e[3] == 'SOA']
+            if len(soa) != 1:
+                return 400, {'badRequest': {'code': 400,
+                                            'message': 'missing SOA'}}
+            domain = self.api._create_domain(soa[0][0].rstrip('.'))
+            for name, ttl, _, rtype, data in entries:
+                if rtype != 'SOA':
+                    self.api._create_record(domain, {
+                        'name': name.rstrip('.'), 'ttl': int(ttl),
+                        'type': rtype, 'data': data})
+            imported.append(self._domain_json(domain))
+        return 202, self.api._job({'domains': imported})
+
+    def list_records(self, domain_id):
+        domain = self.api.domains.get(int(domain_id))
+        if domain is None:
+            return 404, {'itemNotFound': {'code': 404}}
+        records = sorted(domain['records'].values(), key=lambda r: r['id'])
+        offset = int(self._arg('offset', 0))
+        limit = int(self._arg('limit', 100))
+        return 200, {'records': records[offset:offset + limit],
+                     'totalEntries': len(records)}
+
+    def add_records(self, domain_id):
+        domain = self.api.domains[int(domain_id)]
+        added = [self.api._create_record(domain, record)
+                 for record in self.body['records']]
+        return 202, self.api._job({'records': added})
+
+    def modify_records(self, domain_id):
+        domain = self.api.domains[int(domain_id)]
+        for record in self.body['records']:
+            domain['records'][record['id']].update(record)
+        return 202, self.api._job(None)
+
+    def modify_record(self, domain_id, record_id):
+        domain = self.api.domains[int(domain_id)]
+        domain['records'][record_id].update(self.body)
+        return 202, self.api._job(None)
+
+    def remove_records(self, domain_id):
+        domain = self.api.domains[int(domain_id)]
+        for record_id in self.query.get('id', []):
+            domain['records'].pop(record_id, None)
+        return 202, self.api._job(None)
+
+    def remove_record(self, domain_id, record_id):
+        domain = self.api.domains[int(domain_id)]
+        domain['records'].pop(record_id, None)
+        return 202, self.api._job(None)
+
+    def job_status(self, job_id):
+        job = self.api.jobs.get(job_id)
+        if job is None:
+            return 404, {'itemNotFound': {'code': 404}}
+        body = {'jobId': job_id, 'status': 'RUNNING'}
+        if time.time() - job['_created'] >= self.api.job_time:
+            body['status'] = 'COMPLETED'
+            if job['response'] is not None:
+                body['response'] = job['response']
+        return 200, body
@@ -4,24 +4,70 @@
 """
 Rackspace API access library
 """
+import copy
 import os
 
 from .session import AuthenticatedSession
 from .domains import Domains, Records
 from .servers import Servers, Images, Flavors
 from .servers_firstgen import FirstGenServers, FirstGenImages
-from .exceptions import RackspaceAuthError, RackspaceAPIError
+from .jobs import Job, JobPoller
+from .tokencache import TokenCache
+from .cache import ResponseCache
+from .coalesce import RequestCoalescer
+from .inventory import ServerInventory
+from .zonesync import ZoneReconciler, ChangeSet
+from .ratelimit import RateLimiter
+from .retry import RetryPolicy, CircuitBreaker
+from .transport import Transport
+from .metrics import Metrics
+from .resources import Server, Image, Flavor, Domain, Record
+from .fanout import FanOutSession, FanOutStream
+from .exceptions import (RackspaceAuthError, RackspaceAPIError,
+                         RackspaceTimeoutError, RackspaceCircuitOpenError,
+                         RackspaceServiceError)
+from .async_session import (AsyncAuthenticatedSession, AsyncServers,
+                            AsyncImages, AsyncFlavors, AsyncFirstGenServers,
+                            AsyncFirstGenImages, AsyncDomains, AsyncRecords,
+                            DEFAULT_POOL_SIZE)
+
+
+class _endpoint(object):
+    def __init__(self, name):
+        """
+        An endpoint attribute, built by the session's _build_<name> method
+        the first time it's used after login
+        """
+        self.name = name
+
+    def __get__(self, obj, cls):
+        if obj is None:
+            return self
+        if not obj.authenticated:
+            raise RackspaceAuthError('Not logged in')
+        endpoint = getattr(obj, '_build_' + self.name)()
+        # cache it on the instance, which takes precedence from now on
+        obj.__dict__[self.name] = endpoint
+        return endpoint
 
 
 class RackspaceSession(object):
+    ENDPOINTS = ('servers', 'servers_firstgen', 'domains')
+
+    servers = _endpoint('servers')
+    servers_firstgen = _endpoint('servers_firstgen')
+    domains = _endpoint('domains')
+
     def __init__(self, username=None, api_key=None, password=None,
-                 region=None, auth_url=None):
+                 region=None, auth_url=None, token_cache=None,
+                 transport=None):
         self.username = username
         self.api_key = api_key
         self.password = password
         self.region = region
         self.auth_url = auth_url
-        self.rs_session = AuthenticatedSession()
+        self.rs_session = AuthenticatedSession(token_cache=token_cache,
+                                               transport=transport)
         self.authenticated = False
 
     def login(self):
@@ -42,16 +88,24 @@ class RackspaceSession(object):
         # Authenticate with the Rackspace cloud
         self.rs_session.login(self.username, self.api_key, self.password,
                               self.region, self.auth_url)
+        self._logged_in()
+        return self
+
+    def for_region(self, region):
+        """
+        A session of the same type for another region, sharing this
+        session's token and connection pools, so no further login is needed
+        """
+        session = copy.copy(self)
+        session.region = region
+        session.rs_session = self.rs_session.for_region(region)
+        session._logged_in()
+        return session
+
+    def _logged_in(self):
         self.authenticated = True
 
-        # collect our API endpoints
-        self.servers = Servers(self.rs_session)
-        self.servers.images = Images(self.rs_session)
-        self.servers.flavors = Flavors(self.rs_session)
-        self.servers_firstgen = FirstGenServers(self.rs_session)
-        self.servers_firstgen.images = FirstGenImages(self.rs_session)
-        self.domains = Domains(self.rs_session)
-        self.domains.records = Records(self.rs_session)
+        self._setup_endpoints()
 
         # alias the Session verbs here too
         self.get = self.rs_session.get
@@ -59,4 +113,58 @@ class RackspaceSession(object):
         self.post = self.rs_session.post
         self.delete = self.rs_session.delete
 
-        return self
+    def _setup_endpoints(self):
+        # endpoints are built on first use, so a service missing from the
+        # catalog is only an error if it's used. Drop any built for a
+        # previous login.
+        for name in self.ENDPOINTS:
+            self.__dict__.pop(name, None)
+
+    def _build_servers(self):
+        servers = Servers(self.rs_session)
+        servers.images = Images(self.rs_session)
+        servers.flavors = Flavors(self.rs_session)
+        return servers
+
+    def _build_servers_firstgen(self):
+        servers = FirstGenServers(self.rs_session)
+        servers.images = FirstGenImages(self.rs_session)
+        return servers
+
+    def _build_domains(self):
+        domains = Domains(self.rs_session)
+        domains.records = Records(self.rs_session)
+        return domains
+
+
+class AsyncRackspaceSession(RackspaceSession):
+    def __init__(self, username=None, api_key=None, password=None,
+                 region=None, auth_url=None, token_cache=None,
+                 transport=None, pool_size=DEFAULT_POOL_SIZE):
+        """
+        A RackspaceSession where every endpoint method is dispatched to a
+        worker pool, and returns an AsyncResult instead of the raw JSON.
+
+        :param pool_size: maximum number of concurrent requests
+        """
+        RackspaceSession.__init__(self, username, api_key, password,
+                                  region, auth_url)
+        self.rs_session = AsyncAuthenticatedSession(pool_size,
+                                                    token_cache=token_cache,
+                                                    transport=transport)
+
+    def _build_servers(self):
+        servers = AsyncServers(self.rs_session)
+        servers.images = AsyncImages(self.rs_session)
+        servers.flavors = AsyncFlavors(self.rs_session)
+        return servers
+
+    def _build_servers_firstgen(self):
+        servers = AsyncFirstGenServers(self.rs_session)
+        servers.images = AsyncFirstGenImages(self.rs_session)
+        return servers
+
+    def _build_domains(self):
+        domains = AsyncDomains(self.rs_session)
+        domains.records = AsyncRecords(self.rs_session)
+        return domains
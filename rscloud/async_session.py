@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# Copyright 2012 litl, LLC. All Rights Reserved.
+
+from .session import AuthenticatedSession
+from .transport import Transport, DEFAULT_POOL_MAXSIZE
+from .domains import Domains, Records
+from .servers import Servers, Images, Flavors
+from .servers_firstgen import FirstGenServers, FirstGenImages
+
+# number of requests allowed in flight at once
+DEFAULT_POOL_SIZE = 32
+
+
+class AsyncAuthenticatedSession(AuthenticatedSession):
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, token_cache=None,
+                 transport=None):
+        """
+        An authenticated session for the rackspace api, which can dispatch
+        calls concurrently.
+
+        Calls are run on a pool of worker threads, and return an AsyncResult.
+        Use result.get() to wait for, and retrieve the return value.
+
+        :param pool_size: maximum number of concurrent requests
+        :param token_cache: rscloud.TokenCache used to share tokens between
+            processes
+        :param transport: rscloud.Transport to share connection pools with
+            other sessions. By default the connection pool is sized to
+            pool_size.
+        """
+        if transport is None:
+            transport = Transport(pool_maxsize=max(pool_size,
+                                                   DEFAULT_POOL_MAXSIZE))
+        AuthenticatedSession.__init__(self, token_cache=token_cache,
+                                      transport=transport)
+        self.pool_size = pool_size
+        self._pool = None
+
+    def for_region(self, region):
+        session = AuthenticatedSession.for_region(self, region)
+        # with its own workers, of the same pool_size
+        session._pool = None
+        return session
+
+    @property
+    def pool(self):
+        # start the workers on first use
+        if self._pool is None:
+            from multiprocessing.pool import ThreadPool
+            self._pool = ThreadPool(self.pool_size)
+        return self._pool
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Call func(*args, **kwargs) in the worker pool
+
+        :returns: multiprocessing.pool.AsyncResult
+        """
+        return self.pool.apply_async(func, args, kwargs)
+
+    # the http verbs, returning an AsyncResult for the response
+    def get_async(self, url, **kwargs):
+        return self.submit(self.get, url, **kwargs)
+
+    def post_async(self, url, data=None, **kwargs):
+        return self.submit(self.post, url, data=data, **kwargs)
+
+    def put_async(self, url, data=None, **kwargs):
+        return self.submit(self.put, url, data=data, **kwargs)
+
+    def delete_async(self, url, **kwargs):
+        return self.submit(self.delete, url, **kwargs)
+
+    def close(self):
+        """
+        Stop the worker pool, waiting for outstanding calls to finish
+        """
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+
+class AsyncEndpoint(object):
+    # the synchronous endpoint class being wrapped
+    endpoint_class = None
+
+    def __init__(self, session):
+        """
+        Wrap an API endpoint so that every method call is run in the session
+        worker pool. Each method returns an AsyncResult, and result.get()
+        returns the same raw JSON as the synchronous endpoint.
+
+        :param session: rscloud.AsyncAuthenticatedSession
+        """
+        self._sess = session
+        self._endpoint = self.endpoint_class(session)
+
+    def __getattr__(self, name):
+        attr = getattr(self._endpoint, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            return self._sess.submit(attr, *args, **kwargs)
+        call.__name__ = name
+        call.__doc__ = attr.__doc__
+        return call
+
+
+class AsyncServers(AsyncEndpoint):
+    endpoint_class = Servers
+
+
+class AsyncImages(AsyncEndpoint):
+    endpoint_class = Images
+
+
+class AsyncFlavors(AsyncEndpoint):
+    endpoint_class = Flavors
+
+
+class AsyncFirstGenServers(AsyncEndpoint):
+    endpoint_class = FirstGenServers
+
+
+class AsyncFirstGenImages(AsyncEndpoint):
+    endpoint_class = FirstGenImages
+
+
+class AsyncDomains(AsyncEndpoint):
+    endpoint_class = Domains
+
+
+class AsyncRecords(AsyncEndpoint):
+    endpoint_class = Records
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# Copyright 2012 litl, LLC. All Rights Reserved.
+
+import re
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_MAX_ENTRIES = 256
+
+# (url path regex, seconds) pairs of cacheable resources. Images and
+# flavors rarely change, and are invalidated by any mutating call anyway.
+DEFAULT_TTLS = [
+    (r'/images(/[^/]*)?(/detail)?$', 300),
+    (r'/flavors(/[^/]*)?(/detail)?$', 3600),
+]
+
+
+class _Entry(object):
+    def __init__(self, response, expires):
+        self.response = response
+        self.expires = expires
+        self.etag = response.headers.get('etag')
+        self.last_modified = response.headers.get('last-modified')
+
+
+class ResponseCache(object):
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttls=DEFAULT_TTLS):
+        """
+        An LRU cache of GET responses.
+
+        Only urls matching one of the ttls patterns are cached. Once an entry
+        expires it's revalidated with If-None-Match/If-Modified-Since when
+        the API supplied an ETag or Last-Modified header. Every caller gets
+        its own copy of a cached response, so modifying its json is safe.
+
+        :param max_entries: maximum number of cached responses
+        :param ttls: list of (url path regex, seconds) pairs
+        """
+        self.max_entries = max_entries
+        self.ttls = [(re.compile(pattern), ttl) for pattern, ttl in ttls]
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # bumped by every invalidation, so a response fetched before an
+        # invalidation is never stored after it
+        self._generation = 0
+
+    def ttl(self, url):
+        """
+        Seconds to cache the response from url, or None if it's not cached
+        """
+        path = url.split('?', 1)[0]
+        for pattern, ttl in self.ttls:
+            if pattern.search(path):
+                return ttl
+        return None
+
+    def get(self, url, kwargs, fetch):
+        """
+        Return the cached response for url, calling fetch(url, **kwargs) to
+        retrieve or revalidate it.
+        """
+        ttl = self.ttl(url)
+        if ttl is None:
+            return fetch(url, **kwargs)
+
+        key = self._key(url, kwargs.get('params'))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries[key] = self._entries.pop(key)
+            generation = self._generation
+
+        now = time.time()
+        if entry is not None and entry.expires > now:
+            return entry.response.copy()
+
+        if entry is not None and (entry.etag or entry.last_modified):
+            headers = dict(kwargs.get('headers') or {})
+            if entry.etag:
+                headers['If-None-Match'] = entry.etag
+            if entry.last_modified:
+                headers['If-Modified-Since'] = entry.last_modified
+            kwargs = dict(kwargs, headers=headers)
+
+        resp = fetch(url, **kwargs)
+        if resp.status_code == 304 and entry is not None:
+            entry.expires = now + ttl
+            resp = entry.response
+        elif resp.status_code != 200:
+            return resp
+
+        with self._lock:
+            if generation == self._generation:
+                self._entries.pop(key, None)
+                self._entries[key] = _Entry(resp, now + ttl)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return resp.copy()
+
+    def invalidate(self, prefix):
+        """
+        Drop all entries for urls starting with prefix
+        """
+        with self._lock:
+            self._generation += 1
+            for key in list(self._entries):
+                if key[0].startswith(prefix):
+                    del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def _key(self, url, params):
+        if not params:
+            return (url, ())
+        return (url, tuple(sorted((k, str(v)) for k, v in params.items()
+                                  if v is not None)))
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# Copyright 2012 litl, LLC. All Rights Reserved.
+
+import threading
+
+# seconds a caller waits on an identical request before sending its own
+DEFAULT_MAX_WAIT = 30
+
+# request arguments that can be part of a coalesced request; anything else,
+# like a streamed response, is always sent separately
+_COALESCED_ARGS = ('params', 'headers')
+
+
+class _Call(object):
+    def __init__(self):
+        self.done = threading.Event()
+        self.response = None
+        self.error = None
+
+
+class RequestCoalescer(object):
+    def __init__(self, max_wait=DEFAULT_MAX_WAIT):
+        """
+        Coalesce concurrent identical GET requests.
+
+        While a GET for a url and params is in flight, other callers making
+        the same request wait for it and get a copy of its response, instead
+        of sending their own. If it fails they all get the same error.
+
+        :param max_wait: seconds to wait for an in flight request, before
+            giving up and sending a new one
+        """
+        self.max_wait = max_wait
+        self.coalesced = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def get(self, url, kwargs, fetch):
+        """
+        Return the response for url, calling fetch(url, **kwargs) unless an
+        identical request is already in flight
+        """
+        if any(arg not in _COALESCED_ARGS for arg in kwargs):
+            return fetch(url, **kwargs)
+
+        key = self._key(url, kwargs)
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            if not call.done.wait(self.max_wait):
+                return fetch(url, **kwargs)
+            if call.error is not None:
+                raise call.error
+            return call.response.copy()
+
+        try:
+            call.response = fetch(url, **kwargs)
+        except Exception as err:
+            call.error = err
+            raise
+        finally:
+            with self._lock:
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+            call.done.set()
+        return call.response
+
+    def invalidate(self, prefix):
+        """
+        Stop sharing in flight requests for urls starting with prefix, so
+        later callers send a new request
+        """
+        with self._lock:
+            for key in list(self._calls):
+                if key[0].startswith(prefix):
+                    del self._calls[key]
+
+    def _key(self, url, kwargs):
+        params = kwargs.get('params') or {}
+        headers = kwargs.get('headers') or {}
+        return (url,
+                tuple(sorted((k, str(v)) for k, v in params.items()
+                             if v is not None)),
+                tuple(sorted(headers.items())))
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# Copyright 2012 litl, LLC. All Rights Reserved.
+
+import json
+
+# optional faster json libraries
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+class JSONCodec(object):
+    """
+    Encode request bodies and decode responses with the standard library
+    """
+    name = 'json'
+
+    def dumps(self, obj):
+        return json.dumps(obj)
+
+    def loads(self, data):
+        return json.loads(data)
+
+
+class OrjsonCodec(JSONCodec):
+    name = 'orjson'
+
+    def dumps(self, obj):
+        return orjson.dumps(obj)
+
+    def loads(self, data):
+        return orjson.loads(data)
+
+
+class UjsonCodec(JSONCodec):
+    name = 'ujson'
+
+    def dumps(self, obj):
+        return ujson.dumps(obj)
+
+    def loads(self, data):
+        return ujson.loads(data)
+
+
+def default_codec():
+    """
+    The fastest codec available
+    """
+    if orjson is not None:
+        return OrjsonCodec()
+    if ujson is not None:
+        return UjsonCodec()
+    return JSONCodec()
+
+
+class JSONResponse(object):
+    def __init__(self, response, codec):
+        """
+        Wrap a requests response, so the body is decoded only once, with the
+        session codec. All other attributes are those of the response.
+        """
+        self.response = response
+        self._codec = codec
+        self._decoded = False
+        self._json = None
+
+    @property
+    def json(self):
+        if not self._decoded:
+            content = self.response.content
+            try:
+                self._json = self._codec.loads(content) if content else None
+            except ValueError:
+                # not json, same as requests
+                self._json = None
+            self._decoded = True
+        return self._json
+
+    def copy(self):
+        """
+        A wrapper of the same response, decoding its own copy of the body,
+        so one holder modifying the json doesn't affect another
+        """
+        return JSONResponse(self.response, self._codec)
+
+    def __getattr__(self, name):
+        return getattr(self.response, name)
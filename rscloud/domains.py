@@ -1,7 +1,78 @@
 #!/usr/bin/env python
 # Copyright 2012 litl, LLC. All Rights Reserved.
 
-import json
+import threading
+import time
+
+from .exceptions import RackspaceAPIError, RackspaceTimeoutError
+from .jobs import JobPoller
+from .resources import Record
+from .util import Result
+
+# maximum number of records the DNS API accepts in a single request
+MAX_RECORDS_PER_REQUEST = 100
+
+# zones imported per request, and the most zone text sent in one request,
+# keeping import bodies well inside the API request size limit
+IMPORT_BATCH_SIZE = 10
+MAX_IMPORT_BYTES = 512 * 1024
+# import requests whose jobs run at once
+IMPORT_CONCURRENCY = 4
+# export jobs run at once, and so zones held in memory
+EXPORT_CONCURRENCY = 4
+
+
+def _chunks(items, size):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def zone_files(paths):
+    """
+    Read BIND 9 zone files one at a time, as import_zones() needs them
+    """
+    for path in paths:
+        with open(path) as f:
+            yield f.read()
+
+
+def _acquire(slots, deadline):
+    # Semaphore.acquire can't time out in python 2, so poll it
+    if deadline is None:
+        return slots.acquire()
+    while not slots.acquire(False):
+        if time.time() >= deadline:
+            return False
+        time.sleep(0.05)
+    return True
+
+
+def _zone_batches(zones, batch_size, max_bytes):
+    # lazily group zones into (indexes, contents) batches of at most
+    # batch_size zones and max_bytes of zone text; a bigger zone goes alone
+    indexes, batch, size = [], [], 0
+    for index, zone in enumerate(zones):
+        if hasattr(zone, 'read'):
+            zone = zone.read()
+        if batch and (len(batch) >= batch_size or
+                      size + len(zone) > max_bytes):
+            yield indexes, batch
+            indexes, batch, size = [], [], 0
+        indexes.append(index)
+        batch.append(zone)
+        size += len(zone)
+    if batch:
+        yield indexes, batch
+
+
+def _write_zone(dest, contents):
+    # dest is a path or a file-like object
+    if hasattr(dest, 'write'):
+        dest.write(contents)
+        return
+    with open(dest, 'w') as f:
+        f.write(contents)
 
 
 class Domains(object):
@@ -12,7 +83,7 @@ class Domains(object):
         :param session: rscloud.AuthenticatedSession
         """
         self._sess = session
-        self._url = session.sc['cloudDNS']['publicURL'] + '/domains'
+        self._url = session.service_url('cloudDNS') + '/domains'
 
     def list(self, domain_name=None):
         if domain_name:
@@ -22,16 +93,30 @@ class Domains(object):
         resp = self._sess.get(self._url, params=params)
         return resp.json
 
+    def limits(self):
+        url = self._url.rsplit('/', 1)[0] + '/limits'
+        resp = self._sess.get(url)
+        return resp.json
+
     def list_subdomains(self, domain_id):
         url = self._url + '/' + str(domain_id) + '/subdomains'
         resp = self._sess.get(url)
         return resp.json
 
-    def detail(self, domain_id, records=True, subdomains=False):
+    def detail(self, domain_id, records=True, subdomains=False,
+               stream=False):
+        """
+        :param stream: parse the response incrementally, and return an
+            iterator over the domain records instead of the whole response
+        """
         url = self._url + '/' + str(domain_id)
         params = {'showRecords': str(bool(records)).lower(),
                   'showSubdomains': str(bool(subdomains)).lower()}
 
+        if stream:
+            return self._sess.iter_json(url, ('recordsList', 'records'),
+                                        params=params)
+
         resp = self._sess.get(url, params=params)
         return resp.json
 
@@ -49,11 +134,67 @@ class Domains(object):
         resp = self._sess.get(url)
         return resp.json
 
+    def export_to(self, destinations, concurrency=EXPORT_CONCURRENCY,
+                  poller=None, timeout=None):
+        """
+        Export zones in BIND 9 format, writing each one out as soon as its
+        export job completes, with up to `concurrency` exports running at
+        once, so only the zones in flight are held in memory.
+
+        :param destinations: dict of domain id to a path or file-like
+            object to write the zone to
+        :param concurrency: maximum export jobs running at once
+        :param poller: rscloud.JobPoller tracking the export jobs
+        :param timeout: total seconds for all the exports
+        :returns: list of Result, with the domain id as the item and the
+            number of characters written as the value
+        """
+        if poller is None:
+            poller = JobPoller(self._sess, concurrency=concurrency)
+        slots = threading.Semaphore(concurrency)
+        deadline = None
+        if timeout is not None:
+            deadline = time.time() + timeout
+
+        results = []
+        jobs = []
+        for domain_id, dest in destinations.items():
+            result = Result(domain_id)
+            results.append(result)
+            if not _acquire(slots, deadline):
+                raise RackspaceTimeoutError('timed out waiting for jobs')
+            try:
+                resp = self.export(domain_id)
+            except Exception as err:
+                result.error = err
+                slots.release()
+                continue
+
+            def write(job, result=result, dest=dest):
+                try:
+                    if not job.ok:
+                        result.error = RackspaceAPIError(job.error)
+                        return
+                    contents = job.response['contents']
+                    # don't hold on to the zone once it's written
+                    job.response = None
+                    _write_zone(dest, contents)
+                    result.value = len(contents)
+                except Exception as err:
+                    result.error = err
+                finally:
+                    slots.release()
+            jobs.append(poller.add(resp, write))
+
+        if deadline is not None:
+            timeout = max(0, deadline - time.time())
+        poller.wait_all(jobs, timeout)
+        return results
+
     def create(self, domain_records):
         # async with callback
         # TODO: make it easier to specify domain records
-        body = json.dumps(domain_records)
-        resp = self._sess.post(self._url, data=body)
+        resp = self._sess.post(self._url, data=domain_records)
         return resp.json
 
     def import_domains(self, records):
@@ -67,11 +208,71 @@ class Domains(object):
         for rec in records:
             domains.append({'contentType': 'BIND_9', 'contents': rec})
 
-        body = json.dumps({'domains': domains})
+        body = {'domains': domains}
 
         resp = self._sess.post(url, data=body)
         return resp.json
 
+    def import_zones(self, zones, batch_size=IMPORT_BATCH_SIZE,
+                     max_bytes=MAX_IMPORT_BYTES,
+                     concurrency=IMPORT_CONCURRENCY, poller=None,
+                     timeout=None, callback=None):
+        """
+        Import any number of BIND 9 zones, in batches of several zones per
+        request, with up to `concurrency` import jobs running at once.
+
+        Zones are read lazily, as each batch is sent, so zones can be a
+        generator such as zone_files(paths).
+
+        :param zones: iterable of zone contents or file-like objects
+        :param batch_size: maximum zones per import request
+        :param max_bytes: maximum zone text per import request
+        :param concurrency: maximum import jobs running at once
+        :param poller: rscloud.JobPoller tracking the import jobs
+        :param timeout: total seconds for the import, including waiting for
+            running jobs to make room for the remaining batches
+        :param callback: called with each batch Result as it completes
+        :returns: list of Result, one per batch, with the indexes of its
+            zones in `zones` as the item and the job response as the value
+        """
+        if poller is None:
+            poller = JobPoller(self._sess, concurrency=concurrency)
+        slots = threading.Semaphore(concurrency)
+        deadline = None
+        if timeout is not None:
+            deadline = time.time() + timeout
+
+        results = []
+        jobs = []
+        for indexes, batch in _zone_batches(zones, batch_size, max_bytes):
+            result = Result(indexes)
+            results.append(result)
+            if not _acquire(slots, deadline):
+                raise RackspaceTimeoutError('timed out waiting for jobs')
+            try:
+                resp = self.import_domains(batch)
+            except Exception as err:
+                result.error = err
+                slots.release()
+                if callback:
+                    callback(result)
+                continue
+
+            def finished(job, result=result):
+                if job.ok:
+                    result.value = job.response
+                else:
+                    result.error = RackspaceAPIError(job.error)
+                slots.release()
+                if callback:
+                    callback(result)
+            jobs.append(poller.add(resp, finished))
+
+        if deadline is not None:
+            timeout = max(0, deadline - time.time())
+        poller.wait_all(jobs, timeout)
+        return results
+
     def modify(self, domain_id, email, ttl, comment):
         # async with callback
         url = self._url + '/' + str(domain_id)
@@ -80,7 +281,7 @@ class Domains(object):
                 'ttl': int(ttl),
                 }
 
-        resp = self._sess.put(url, data=json.dumps(body))
+        resp = self._sess.put(url, data=body)
         return resp.json
 
     def remove(self, domain_ids, subdomains=False):
@@ -103,13 +304,38 @@ class Domains(object):
 class Records(object):
     def __init__(self, session):
         self._sess = session
-        self._url = session.sc['cloudDNS']['publicURL'] + '/domains'
+        self._url = session.service_url('cloudDNS') + '/domains'
 
-    def list(self, domainId):
+    def list(self, domainId, limit=None, offset=None):
         url = self._url + '/' + str(domainId) + '/records'
-        resp = self._sess.get(url)
+        params = {}
+        if limit:
+            params['limit'] = limit
+        if offset:
+            params['offset'] = offset
+        resp = self._sess.get(url, params=params)
         return resp.json
 
+    def iter_records(self, domainId, page_size=MAX_RECORDS_PER_REQUEST,
+                     typed=False):
+        """
+        Iterate over all records of a domain, following the pagination
+        offset.
+
+        :param domainId: id of the domain
+        :param page_size: number of records retrieved per request
+        :param typed: yield rscloud.Record objects instead of dicts
+        """
+        offset = 0
+        while True:
+            page = self.list(domainId, limit=page_size, offset=offset)
+            records = page.get('records', [])
+            for record in records:
+                yield Record(record, self._sess.region) if typed else record
+            offset += len(records)
+            if not records or offset >= page.get('totalEntries', 0):
+                break
+
     def search(self, domainId, record_type='A', name=None, data=None):
         url = self._url + '/' + str(domainId) + '/records'
         params = {
@@ -127,7 +353,6 @@ class Records(object):
 
     def add(self, domainId, name, data, record_type, priority=None,
             ttl=None, comment=None):
-        #TODO: add multiple records
         url = self._url + '/' + str(domainId) + '/records'
         record = {
             'name': name,
@@ -141,7 +366,7 @@ class Records(object):
         if comment:
             record['comment'] = comment
 
-        req_data = json.dumps({'records': [record]})
+        req_data = {'records': [record]}
 
         resp = self._sess.post(url, data=req_data)
         return resp.json
@@ -166,10 +391,62 @@ class Records(object):
         if comment:
             record_data['comment'] = comment
 
-        req_data = json.dumps(record_data)
-        resp = self._sess.put(url, data=req_data)
+        resp = self._sess.put(url, data=record_data)
         return resp.json
 
+    def add_many(self, domainId, records,
+                 chunk_size=MAX_RECORDS_PER_REQUEST):
+        """
+        Add multiple records, in as few requests as possible
+
+        :param domainId: id of the domain
+        :param records: list of record dicts, with name, type and data, and
+            optionally priority, ttl and comment
+        :param chunk_size: maximum number of records per request
+        :returns: list of asynchronous job responses, one per request
+        """
+        url = self._url + '/' + str(domainId) + '/records'
+        resps = []
+        for chunk in _chunks(records, chunk_size):
+            req_data = {'records': chunk}
+            resps.append(self._sess.post(url, data=req_data).json)
+        return resps
+
+    def modify_many(self, domainId, records,
+                    chunk_size=MAX_RECORDS_PER_REQUEST):
+        """
+        Modify multiple records, in as few requests as possible
+
+        :param domainId: id of the domain
+        :param records: list of record dicts, each with the record id and
+            the fields to change
+        :param chunk_size: maximum number of records per request
+        :returns: list of asynchronous job responses, one per request
+        """
+        url = self._url + '/' + str(domainId) + '/records'
+        resps = []
+        for chunk in _chunks(records, chunk_size):
+            req_data = {'records': chunk}
+            resps.append(self._sess.put(url, data=req_data).json)
+        return resps
+
+    def remove_many(self, domainId, recordIds,
+                    chunk_size=MAX_RECORDS_PER_REQUEST):
+        """
+        Remove multiple records, in as few requests as possible
+
+        :param domainId: id of the domain
+        :param recordIds: list of record ids
+        :param chunk_size: maximum number of records per request
+        :returns: list of asynchronous job responses, one per request
+        """
+        url = self._url + '/' + str(domainId) + '/records'
+        resps = []
+        for chunk in _chunks(recordIds, chunk_size):
+            params = {'id': [str(record_id) for record_id in chunk]}
+            resps.append(self._sess.delete(url, params=params).json)
+        return resps
+
 
 class Rdns(object):
     def __init__(self, session):
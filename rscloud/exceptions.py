@@ -7,3 +7,18 @@ class RackspaceAPIError(Exception):
     """
     An error return by an API call
     """
+
+class RackspaceTimeoutError(RackspaceAPIError):
+    """
+    Timed out waiting for an asynchronous operation to complete
+    """
+
+class RackspaceCircuitOpenError(RackspaceAPIError):
+    """
+    Request not sent, because its host has been failing
+    """
+
+class RackspaceServiceError(RackspaceAPIError):
+    """
+    A service isn't available in the service catalog for this region
+    """
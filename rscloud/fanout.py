@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+# Copyright 2012 litl, LLC. All Rights Reserved.
+
+import Queue
+import threading
+
+from .util import run_concurrently
+
+# items buffered per stream, before the regions wait on the consumer
+DEFAULT_BUFFER_SIZE = 1000
+
+_DONE = object()
+
+
+class FanOutStream(object):
+    def __init__(self, sessions, func, concurrency, buffer_size):
+        """
+        The merged output of func(session) for every session, in the order
+        the items arrive.
+
+        Iterating yields (label, item) pairs. A session that fails stops
+        contributing items, and its exception is recorded in errors, keyed
+        by label, while the others carry on.
+        """
+        self.errors = {}
+        self._queue = Queue.Queue(buffer_size)
+        self._closed = threading.Event()
+        self._slots = threading.Semaphore(concurrency)
+        self._running = len(sessions)
+        for label, session in sessions.items():
+            thread = threading.Thread(target=self._produce,
+                                      args=(label, session, func))
+            thread.daemon = True
+            thread.start()
+
+    def _produce(self, label, session, func):
+        with self._slots:
+            try:
+                for item in func(session):
+                    if not self._put((label, item)):
+                        return
+            except Exception as err:
+                self.errors[label] = err
+            finally:
+                self._put(_DONE)
+
+    def _put(self, item):
+        # wait for room in the queue, unless the consumer has gone away
+        while not self._closed.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except Queue.Full:
+                pass
+        return False
+
+    def __iter__(self):
+        # stop the producers too if the consumer stops early
+        try:
+            while self._running:
+                item = self._queue.get()
+                if item is _DONE:
+                    self._running -= 1
+                    continue
+                yield item
+        finally:
+            self.close()
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    def close(self):
+        """
+        Stop retrieving items, when the stream won't be read to the end
+        """
+        self._closed.set()
+
+
+class FanOutSession(object):
+    def __init__(self, sessions, concurrency=None,
+                 buffer_size=DEFAULT_BUFFER_SIZE):
+        """
+        Run the same query against many regions or accounts at once, so a
+        global query takes about as long as the slowest region.
+
+        :param sessions: dict of logged in rscloud.RackspaceSession, keyed
+            by a label identifying each region or account
+        :param concurrency: maximum number of sessions queried at once,
+            defaults to all of them
+        :param buffer_size: items buffered by each stream
+        """
+        self.sessions = dict(sessions)
+        self.concurrency = concurrency or max(1, len(self.sessions))
+        self.buffer_size = buffer_size
+
+    @classmethod
+    def for_regions(cls, sessions, regions=None,
+                    service='cloudServersOpenStack', **kwargs):
+        """
+        Fan out over the regions of one or more accounts, reusing each
+        account's token.
+
+        :param sessions: a logged in rscloud.RackspaceSession, or a dict of
+            them keyed by account
+        :param regions: regions to include, defaults to every region with an
+            endpoint for service
+        :param service: service name used to discover the regions
+        :returns: FanOutSession labeled by region, or by (account, region)
+            when given a dict of sessions
+        """
+        if isinstance(sessions, dict):
+            accounts = sessions.items()
+        else:
+            accounts = [(None, sessions)]
+
+        regional = {}
+        for account, session in accounts:
+            names = regions
+            if names is None:
+                names = session.rs_session.regions(service)
+            for region in names:
+                if region == session.rs_session.region:
+                    region_session = session
+                else:
+                    region_session = session.for_region(region)
+                label = region if account is None else (account, region)
+                regional[label] = region_session
+        return cls(regional, **kwargs)
+
+    def map(self, func):
+        """
+        Call func(session) for every session concurrently
+
+        :returns: list of Result, with the session label as the item
+        """
+        return run_concurrently(lambda label: func(self.sessions[label]),
+                                sorted(self.sessions), self.concurrency)
+
+    def iter(self, func):
+        """
+        Merge the iterables returned by func(session) for every session
+
+        :returns: FanOutStream of (label, item) pairs
+        """
+        return FanOutStream(self.sessions, func, self.concurrency,
+                            self.buffer_size)
+
+    def iter_servers(self, **kwargs):
+        """
+        All servers in every region, as (label, server) pairs
+
+        :param kwargs: passed through to Servers.iter_servers
+        """
+        return self.iter(lambda rs: rs.servers.iter_servers(**kwargs))
+
+    def iter_images(self, **kwargs):
+        return self.iter(lambda rs: rs.servers.images.iter_images(**kwargs))
+
+    def iter_flavors(self, **kwargs):
+        return self.iter(lambda rs: rs.servers.flavors.iter_flavors(**kwargs))
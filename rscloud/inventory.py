@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+# Copyright 2012 litl, LLC. All Rights Reserved.
+
+import json
+import threading
+from datetime import datetime
+
+from .servers import DEFAULT_PAGE_SIZE, CHANGES_SINCE_OVERLAP
+from .resources import Server
+
+SNAPSHOT_VERSION = 1
+
+
+def _server_ips(server):
+    ips = set()
+    for addrs in server.get('addresses', {}).values():
+        for addr in addrs:
+            ips.add(addr['addr'])
+    for key in ('accessIPv4', 'accessIPv6'):
+        if server.get(key):
+            ips.add(server[key])
+    return ips
+
+
+def _index_values(server):
+    # (index name, values) for each of a server's indexed attributes
+    if isinstance(server, Server):
+        return [('name', [server.name]),
+                ('status', [server.status]),
+                ('flavor', [server.flavor_id]),
+                ('image', [server.image_id]),
+                ('ip', server.ips())]
+    flavor = server.get('flavor') or {}
+    image = server.get('image') or {}
+    return [('name', [server.get('name')]),
+            ('status', [server.get('status')]),
+            ('flavor', [flavor.get('id')]),
+            ('image', [image.get('id')]),
+            ('ip', _server_ips(server))]
+
+
+def _server_id(server):
+    return server.id if isinstance(server, Server) else server['id']
+
+
+def _server_status(server):
+    if isinstance(server, Server):
+        return server.status
+    return server.get('status')
+
+
+def _server_dict(server):
+    return server.raw if isinstance(server, Server) else server
+
+
+class ServerInventory(object):
+    INDEXES = ('name', 'status', 'flavor', 'image', 'ip')
+
+    def __init__(self, servers, page_size=DEFAULT_PAGE_SIZE, typed=False):
+        """
+        Local copy of all next-gen servers, kept up to date incrementally.
+
+        The first sync() loads every server, and later syncs only request
+        servers changed since the previous one.
+
+        :param servers: rscloud.Servers endpoint
+        :param page_size: number of servers retrieved per request
+        :param typed: keep servers as compact rscloud.Server objects
+            instead of dicts
+        """
+        self._servers_api = servers
+        self.page_size = page_size
+        self.typed = typed
+        self.servers = {}
+        # changes-since timestamp for the next sync
+        self.last_sync = None
+        self._indexes = dict((name, {}) for name in self.INDEXES)
+        self._lock = threading.RLock()
+
+    def sync(self):
+        """
+        Bring the inventory up to date
+
+        :returns: number of servers added, changed or removed
+        """
+        started = datetime.utcnow() - CHANGES_SINCE_OVERLAP
+        kwargs = {'detail': True, 'page_size': self.page_size,
+                  'typed': self.typed}
+        if self.last_sync is None:
+            servers = list(self._servers_api.iter_servers(**kwargs))
+            with self._lock:
+                self._clear()
+                for server in servers:
+                    self._add(server)
+        else:
+            kwargs['changes_since'] = self.last_sync
+            servers = list(self._servers_api.iter_servers(**kwargs))
+            with self._lock:
+                for server in servers:
+                    self._remove(_server_id(server))
+                    if _server_status(server) != 'DELETED':
+                        self._add(server)
+
+        self.last_sync = started.strftime('%Y-%m-%dT%H:%M:%SZ')
+        return len(servers)
+
+    def get(self, server_id):
+        return self.servers.get(server_id)
+
+    def find(self, **criteria):
+        """
+        Return all servers matching every criteria, e.g.
+        find(status='ACTIVE', flavor='2')
+
+        :param criteria: index name and value pairs; one of name, status,
+            flavor, image or ip
+        """
+        with self._lock:
+            ids = None
+            for name, value in criteria.items():
+                matches = self._indexes[name].get(value, set())
+                ids = matches if ids is None else ids & matches
+            if ids is None:
+                ids = self.servers.keys()
+            return [self.servers[i] for i in ids]
+
+    def __len__(self):
+        return len(self.servers)
+
+    def __iter__(self):
+        return iter(list(self.servers.values()))
+
+    def snapshot(self):
+        """
+        Return the inventory as a JSON serializable dict, for restore()
+        """
+        with self._lock:
+            return {'version': SNAPSHOT_VERSION,
+                    'last_sync': self.last_sync,
+                    'servers': [_server_dict(server)
+                                for server in self.servers.values()]}
+
+    def restore(self, snapshot):
+        """
+        Load the inventory from a snapshot(), so the next sync is
+        incremental
+        """
+        if snapshot.get('version') != SNAPSHOT_VERSION:
+            raise ValueError('unsupported inventory snapshot version')
+        with self._lock:
+            self._clear()
+            for server in snapshot['servers']:
+                if self.typed:
+                    server = Server(server, self._servers_api._sess.region)
+                self._add(server)
+            self.last_sync = snapshot['last_sync']
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.snapshot(), f)
+
+    def load(self, path):
+        with open(path) as f:
+            self.restore(json.load(f))
+
+    def _clear(self):
+        self.servers = {}
+        self._indexes = dict((name, {}) for name in self.INDEXES)
+
+    def _add(self, server):
+        server_id = _server_id(server)
+        self.servers[server_id] = server
+        for name, values in _index_values(server):
+            index = self._indexes[name]
+            for value in values:
+                index.setdefault(value, set()).add(server_id)
+
+    def _remove(self, server_id):
+        server = self.servers.pop(server_id, None)
+        if server is None:
+            return
+        for name, values in _index_values(server):
+            index = self._indexes[name]
+            for value in values:
+                ids = index.get(value)
+                if ids is None:
+                    continue
+                ids.discard(server_id)
+                if not ids:
+                    del index[value]
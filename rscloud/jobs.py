@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+# Copyright 2012 litl, LLC. All Rights Reserved.
+
+import logging
+import threading
+import time
+
+from .exceptions import RackspaceAPIError, RackspaceTimeoutError
+
+# status values reported by an asynchronous job callback
+COMPLETED = 'COMPLETED'
+ERROR = 'ERROR'
+
+# give up on a job after this many consecutive failed polls
+MAX_POLL_ERRORS = 5
+
+log = logging.getLogger(__name__)
+
+
+class Job(object):
+    def __init__(self, resp, interval):
+        """
+        An asynchronous API job, as returned with a callbackUrl by the DNS
+        API.
+
+        :param resp: raw JSON returned by the asynchronous call
+        :param interval: initial number of seconds between polls
+        """
+        self.callback_url = resp.get('callbackUrl')
+        self.job_id = resp.get('jobId')
+        self.status = resp.get('status')
+        # the final response or error body of the job
+        self.response = None
+        self.error = None
+
+        # set once the callbacks have run, so waiters see their effects
+        self._done = threading.Event()
+        self._finished = False
+        self._lock = threading.Lock()
+        self._callbacks = []
+        self._interval = interval
+        self._next_poll = time.time()
+        self._poll_errors = 0
+
+        if self.callback_url is None:
+            # nothing to poll, the call returned its result directly
+            self._finish(COMPLETED, response=resp)
+
+    @property
+    def done(self):
+        return self._finished
+
+    @property
+    def ok(self):
+        return self.done and self.status == COMPLETED
+
+    def add_callback(self, callback):
+        """
+        Call callback(job) once the job has finished. If it already has,
+        callback is called immediately.
+        """
+        with self._lock:
+            if not self._finished:
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def wait(self, timeout=None):
+        """
+        Wait for the job to finish
+
+        :param timeout: seconds to wait
+        :returns: the job response
+        """
+        if not self._done.wait(timeout) and not self.done:
+            raise RackspaceTimeoutError('timed out waiting for job %s' %
+                                        self.job_id)
+        if self.status != COMPLETED:
+            raise RackspaceAPIError(self.error)
+        return self.response
+
+    def _finish(self, status, response=None, error=None):
+        with self._lock:
+            self.status = status
+            self.response = response
+            self.error = error
+            self._finished = True
+            callbacks = self._callbacks
+            self._callbacks = []
+        try:
+            for callback in callbacks:
+                # a failing callback mustn't stop the others, or the poller
+                try:
+                    callback(self)
+                except Exception:
+                    log.exception('callback for job %s failed', self.job_id)
+        finally:
+            self._done.set()
+
+    def __repr__(self):
+        return '<Job %s %s>' % (self.job_id, self.status)
+
+
+class JobPoller(object):
+    def __init__(self, session, concurrency=10, min_interval=1.0,
+                 max_interval=30.0, backoff=1.5):
+        """
+        Track many asynchronous jobs, polling their callbacks concurrently.
+
+        Each job is polled on its own schedule, starting at min_interval and
+        backing off by `backoff` every time it's found still running, up to
+        max_interval. Polling runs on a background thread which exits when
+        there are no outstanding jobs.
+
+        :param session: rscloud.AuthenticatedSession
+        :param concurrency: maximum number of polls in flight at once
+        :param min_interval: initial seconds between polls of a job
+        :param max_interval: maximum seconds between polls of a job
+        :param backoff: multiplier applied to a job's poll interval
+        """
+        self._sess = session
+        self.concurrency = concurrency
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+
+        self._pending = []
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def add(self, resp, callback=None):
+        """
+        Start tracking an asynchronous job
+
+        :param resp: raw JSON returned by an asynchronous call, or a list of
+            them
+        :param callback: called with the Job once it has finished
+        :returns: Job, or a list of Jobs
+        """
+        if isinstance(resp, (list, tuple)):
+            return [self.add(r, callback) for r in resp]
+
+        job = Job(resp, self.min_interval)
+        if callback:
+            job.add_callback(callback)
+        if job.done:
+            return job
+
+        with self._cond:
+            self._pending.append(job)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run)
+                self._thread.daemon = True
+                self._thread.start()
+            self._cond.notify()
+        return job
+
+    def wait_all(self, jobs=None, timeout=None):
+        """
+        Wait for jobs to finish. Failed jobs are returned, not raised.
+
+        :param jobs: list of Jobs to wait for, defaults to all outstanding
+            jobs
+        :param timeout: total seconds to wait
+        :returns: list of Jobs
+        """
+        if jobs is None:
+            with self._cond:
+                jobs = list(self._pending)
+
+        deadline = None
+        if timeout is not None:
+            deadline = time.time() + timeout
+
+        for job in jobs:
+            remaining = None
+            if deadline is not None:
+                remaining = max(0, deadline - time.time())
+            if not job._done.wait(remaining) and not job.done:
+                raise RackspaceTimeoutError('timed out waiting for jobs')
+        return jobs
+
+    def _run(self):
+        from multiprocessing.pool import ThreadPool
+        pool = ThreadPool(self.concurrency)
+        try:
+            while True:
+                with self._cond:
+                    due = self._due()
+                    if due is None:
+                        self._thread = None
+                        return
+                pool.map(self._poll, due, chunksize=1)
+                with self._cond:
+                    self._pending = [j for j in self._pending if not j.done]
+        finally:
+            with self._cond:
+                # if polling failed, let the next add() start a new thread
+                if self._thread is threading.current_thread():
+                    self._thread = None
+            pool.close()
+            pool.join()
+
+    def _due(self):
+        # Wait for the next jobs due to be polled. Returns None when there
+        # is nothing left to track. Must be called holding self._cond.
+        while self._pending:
+            now = time.time()
+            due = [j for j in self._pending if j._next_poll <= now]
+            if due:
+                return due
+            next_poll = min(j._next_poll for j in self._pending)
+            self._cond.wait(next_poll - now)
+        return None
+
+    def _poll(self, job):
+        try:
+            resp = self._sess.get(job.callback_url,
+                                  params={'showDetails': 'true'}).json
+        except Exception as err:
+            job._poll_errors += 1
+            if job._poll_errors >= MAX_POLL_ERRORS:
+                job._finish(ERROR, error=str(err))
+                return
+            self._reschedule(job)
+            return
+
+        job._poll_errors = 0
+        status = resp.get('status')
+        if status == COMPLETED:
+            job._finish(status, response=resp.get('response'))
+        elif status == ERROR:
+            job._finish(status, error=resp.get('error'))
+        else:
+            if status != job.status:
+                # the job made progress, check back soon
+                job._interval = self.min_interval
+            job.status = status
+            self._reschedule(job)
+
+    def _reschedule(self, job):
+        job._next_poll = time.time() + job._interval
+        job._interval = min(job._interval * self.backoff, self.max_interval)
@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+# Copyright 2012 litl, LLC. All Rights Reserved.
+
+import json
+
+_WHITESPACE = ' \t\n\r'
+# what can follow an array element
+_DELIMITERS = _WHITESPACE + ',]'
+
+_decoder = json.JSONDecoder()
+
+
+class _Scanner(object):
+    def __init__(self, chunks):
+        # buffered text from the chunks iterator
+        self.chunks = iter(chunks)
+        self.buf = ''
+        self.pos = 0
+        self.done = False
+
+    def more(self):
+        """
+        Read another chunk, dropping everything already consumed. Returns
+        False once the input is exhausted.
+        """
+        if self.done:
+            return False
+        for chunk in self.chunks:
+            if chunk:
+                self.buf = self.buf[self.pos:] + chunk
+                self.pos = 0
+                return True
+        self.done = True
+        return False
+
+    def char(self):
+        """
+        Return the next non-whitespace character, without consuming it
+        """
+        while True:
+            buf = self.buf
+            while self.pos < len(buf) and buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.more():
+                return None
+
+    def find_array(self, path):
+        # Scan forward to the start of the array at path, leaving pos just
+        # inside it. Returns False if the document has no such array, and
+        # raises ValueError if it ends before the document does.
+        keys = []  # key of each enclosing object, None for arrays
+        key = None
+        in_string = False
+        escape = False
+        string_start = None
+        expect_key = False
+        while True:
+            if self.pos >= len(self.buf):
+                if string_start is not None:
+                    # keep the partial string in the buffer
+                    offset = self.pos - string_start
+                    self.pos = string_start
+                    if not self.more():
+                        raise ValueError('truncated json document')
+                    string_start = 0
+                    self.pos = offset
+                elif not self.more():
+                    if keys:
+                        raise ValueError('truncated json document')
+                    return False
+                continue
+
+            c = self.buf[self.pos]
+            self.pos += 1
+            if in_string:
+                if escape:
+                    escape = False
+                elif c == '\\':
+                    escape = True
+                elif c == '"':
+                    in_string = False
+                    if expect_key:
+                        key = json.loads(self.buf[string_start:self.pos])
+                    string_start = None
+            elif c == '"':
+                in_string = True
+                string_start = self.pos - 1
+            elif c == '{':
+                keys.append(key)
+                key = None
+                expect_key = True
+            elif c == '[':
+                if tuple(k for k in keys[1:] + [key]) == tuple(path):
+                    return True
+                keys.append(key)
+                key = None
+                expect_key = False
+            elif c in '}]':
+                key = keys.pop() if keys else None
+                expect_key = False
+                if not keys:
+                    # the end of the document
+                    return False
+            elif c == ':':
+                expect_key = False
+            elif c == ',':
+                # the next string in an object is a key
+                expect_key = bool(keys) and key is not None
+
+    def items(self):
+        # decode the elements of the array the scanner is in
+        while True:
+            c = self.char()
+            if c is None:
+                raise ValueError('truncated json array')
+            if c == ']':
+                return
+            if c == ',':
+                self.pos += 1
+                continue
+            while True:
+                try:
+                    item, end = _decoder.raw_decode(self.buf, self.pos)
+                except ValueError:
+                    # incomplete, unless there is no more input
+                    if not self.more():
+                        raise
+                    continue
+                if end < len(self.buf) and self.buf[end] in _DELIMITERS:
+                    break
+                # a number may continue in the next chunk, e.g. -2 of -2.5
+                if not self.more():
+                    break
+            self.pos = end
+            yield item
+
+
+def iter_items(chunks, path):
+    """
+    Incrementally parse a json document, yielding each element of the array
+    at path as soon as it's decoded. Only about one element is held in
+    memory at a time.
+
+    :param chunks: iterable of text chunks of the document
+    :param path: sequence of object keys leading to the array, e.g.
+        ('recordsList', 'records')
+    """
+    scanner = _Scanner(chunks)
+    if not scanner.find_array(path):
+        return
+    for item in scanner.items():
+        yield item
@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+# Copyright 2012 litl, LLC. All Rights Reserved.
+
+import re
+import threading
+
+# upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0, 30.0, float('inf'))
+
+# path segments replaced by {id} in url templates: numbers, uuids and other
+# long hex ids, and typed ids like the A-6822994 of a DNS record
+_ID_SEGMENT = re.compile(r'^(\d+|[0-9a-fA-F-]{16,}|[A-Z]+-\d+)$')
+
+
+def url_template(service, path):
+    """
+    The url template of a request, e.g. cloudServersOpenStack:/servers/{id}
+    """
+    segments = [('{id}' if _ID_SEGMENT.match(seg) else seg)
+                for seg in path.split('/')]
+    return '%s:%s' % (service or 'unknown', '/'.join(segments))
+
+
+class Histogram(object):
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def percentile(self, pct):
+        """
+        Estimate a percentile, as the upper bound of the bucket holding it
+        """
+        if not self.count:
+            return None
+        target = self.count * pct / 100.0
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= target:
+                return min(bound, self.max)
+        return self.max
+
+    def snapshot(self):
+        return {'count': self.count,
+                'sum': self.total,
+                'min': self.min,
+                'max': self.max,
+                'p50': self.percentile(50),
+                'p90': self.percentile(90),
+                'p99': self.percentile(99),
+                'buckets': [(bound, count) for bound, count
+                            in zip(self.buckets, self.counts) if count]}
+
+
+class Metrics(object):
+    def __init__(self):
+        """
+        Per request metrics collected by an AuthenticatedSession.
+
+        Requests are grouped by http verb and url template, so requests for
+        different servers or records are counted together. Span callbacks
+        are called with a dict describing each request attempt, and can be
+        used to forward spans to a tracing system.
+        """
+        self._lock = threading.Lock()
+        self._span_callbacks = []
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.latency = {}
+            self.status = {}
+            self.retries = {}
+            self.errors = {}
+            self.bytes_sent = 0
+            self.bytes_received = 0
+            self.bytes_sent_uncompressed = 0
+            self.bytes_received_uncompressed = 0
+            self.auth_checks = 0
+            self.auth_check_time = 0.0
+            self.logins = 0
+            self.login_time = 0.0
+
+    def add_span_callback(self, callback):
+        """
+        Call callback(span) after every request attempt. span is a dict with
+        the name (url template), method, url, status, start, duration,
+        attempt, bytes_sent, bytes_received, bytes_sent_uncompressed,
+        bytes_received_uncompressed and error.
+        """
+        self._span_callbacks.append(callback)
+
+    def record_request(self, method, template, url, status, start, duration,
+                       attempt, sent=0, received=0, error=None,
+                       sent_uncompressed=None, received_uncompressed=None):
+        # sent and received are bytes on the wire, which are fewer than the
+        # uncompressed sizes when the body was compressed
+        if sent_uncompressed is None:
+            sent_uncompressed = sent
+        if received_uncompressed is None:
+            received_uncompressed = received
+        key = '%s %s' % (method, template)
+        with self._lock:
+            hist = self.latency.get(key)
+            if hist is None:
+                hist = self.latency[key] = Histogram()
+            hist.add(duration)
+            status_key = (key, status)
+            self.status[status_key] = self.status.get(status_key, 0) + 1
+            if attempt > 1:
+                self.retries[key] = self.retries.get(key, 0) + 1
+            if error is not None:
+                self.errors[key] = self.errors.get(key, 0) + 1
+            self.bytes_sent += sent
+            self.bytes_received += received
+            self.bytes_sent_uncompressed += sent_uncompressed
+            self.bytes_received_uncompressed += received_uncompressed
+
+        if self._span_callbacks:
+            span = {'name': template,
+                    'method': method,
+                    'url': url,
+                    'status': status,
+                    'start': start,
+                    'duration': duration,
+                    'attempt': attempt,
+                    'bytes_sent': sent,
+                    'bytes_received': received,
+                    'bytes_sent_uncompressed': sent_uncompressed,
+                    'bytes_received_uncompressed': received_uncompressed,
+                    'error': error}
+            for callback in self._span_callbacks:
+                callback(span)
+
+    def record_auth_check(self, duration):
+        with self._lock:
+            self.auth_checks += 1
+            self.auth_check_time += duration
+
+    def record_login(self, duration):
+        with self._lock:
+            self.logins += 1
+            self.login_time += duration
+
+    def snapshot(self):
+        """
+        Return all metrics as a JSON serializable dict
+        """
+        with self._lock:
+            status = {}
+            for (key, code), count in self.status.items():
+                status.setdefault(key, {})[str(code)] = count
+            return {
+                'requests': dict((key, hist.snapshot())
+                                 for key, hist in self.latency.items()),
+                'status': status,
+                'retries': dict(self.retries),
+                'errors': dict(self.errors),
+                'bytes_sent': self.bytes_sent,
+                'bytes_received': self.bytes_received,
+                'bytes_sent_uncompressed': self.bytes_sent_uncompressed,
+                'bytes_received_uncompressed':
+                    self.bytes_received_uncompressed,
+                'auth': {'checks': self.auth_checks,
+                         'check_time': self.auth_check_time,
+                         'logins': self.logins,
+                         'login_time': self.login_time},
+            }
@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# Copyright 2012 litl, LLC. All Rights Reserved.
+
+import re
+import threading
+import time
+
+UNIT_SECONDS = {
+    'SECOND': 1,
+    'MINUTE': 60,
+    'HOUR': 3600,
+    'DAY': 86400,
+}
+
+# fraction of a limit that may be used in a single burst
+DEFAULT_BURST = 0.1
+
+
+def parse_retry_after(value):
+    """
+    Seconds to wait from a Retry-After header, either a number of seconds
+    or an http date.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        from email.utils import parsedate_tz, mktime_tz
+        parsed = parsedate_tz(value)
+        if parsed is None:
+            return None
+        return max(0.0, mktime_tz(parsed) - time.time())
+
+
+class TokenBucket(object):
+    def __init__(self, rate, capacity, tokens=None):
+        """
+        :param rate: tokens added per second
+        :param capacity: maximum number of tokens held
+        :param tokens: initial number of tokens, defaults to capacity
+        """
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        if tokens is None:
+            tokens = capacity
+        self._tokens = min(float(tokens), self.capacity)
+        self._updated = time.time()
+        self._paused_until = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Take a token, blocking until one is available
+        """
+        while True:
+            with self._lock:
+                now = time.time()
+                self._tokens = min(self.capacity, self._tokens +
+                                   (now - self._updated) * self.rate)
+                self._updated = now
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                elif self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                else:
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """
+        Hand out no tokens for the next `seconds`, and start empty after
+        """
+        with self._lock:
+            self._paused_until = max(self._paused_until,
+                                     time.time() + seconds)
+            self._tokens = 0
+
+
+class RateLimiter(object):
+    def __init__(self, burst=DEFAULT_BURST):
+        """
+        Client side rate limiting of API requests, with a token bucket per
+        service, http verb and uri pattern.
+
+        Limits can be set directly with set_limit(), or seeded from the
+        rate section of an API /limits response with seed().
+
+        :param burst: fraction of each limit that may be used in a burst
+        """
+        self.burst = burst
+        # (service, verb) -> [(uri regex, TokenBucket)]
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def set_limit(self, service, verb, value, unit='MINUTE', regex='.*',
+                  remaining=None):
+        """
+        :param service: service catalog name, e.g. cloudServersOpenStack
+        :param verb: http verb
+        :param value: number of requests allowed per unit
+        :param unit: SECOND, MINUTE, HOUR or DAY
+        :param regex: uri pattern the limit applies to
+        :param remaining: requests currently remaining, if known
+        """
+        rate = float(value) / UNIT_SECONDS[unit.upper()]
+        capacity = max(1, int(value * self.burst))
+        if remaining is not None:
+            remaining = min(remaining, capacity)
+        bucket = TokenBucket(rate, capacity, remaining)
+        with self._lock:
+            buckets = self._buckets.setdefault((service, verb.upper()), [])
+            buckets.append((re.compile(regex), bucket))
+
+    def seed(self, service, limits):
+        """
+        Set limits from the response of an API /limits call
+
+        :param service: service catalog name the limits apply to
+        :param limits: raw JSON from e.g. Servers.limits()
+        """
+        for rate in limits['limits'].get('rate', []):
+            regex = rate.get('regex') or '.*'
+            for limit in rate.get('limit', []):
+                self.set_limit(service, limit['verb'], limit['value'],
+                               limit['unit'], regex, limit.get('remaining'))
+
+    def acquire(self, service, verb, path):
+        """
+        Block until a request is allowed by every matching limit
+
+        :param path: the request uri, including the query string, or a
+            tuple of its forms, e.g. below the service endpoint and in
+            full; a limit applies if its regex matches any of them
+        """
+        for bucket in self._matching(service, verb, path):
+            bucket.acquire()
+
+    def retry_after(self, service, verb, path, seconds):
+        """
+        Pause matching limits after the API rejected a request
+        """
+        for bucket in self._matching(service, verb, path):
+            bucket.pause(seconds)
+
+    def _matching(self, service, verb, path):
+        paths = (path,) if isinstance(path, basestring) else path
+        with self._lock:
+            buckets = list(self._buckets.get((service, verb.upper()), []))
+        return [bucket for regex, bucket in buckets
+                if any(regex.search(p) for p in paths)]
@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+# Copyright 2012 litl, LLC. All Rights Reserved.
+
+"""
+Compact typed objects for API resources, an opt-in alternative to the raw
+json dicts returned by the endpoints.
+
+Each object keeps the commonly used scalar fields as slot attributes, and
+the rest of the resource as one compact json string, which is only decoded
+when a nested field like addresses or metadata is read. Repeated values such
+as status, region, record type and flavor or image ids are interned, so all
+resources share a single copy of each.
+"""
+
+from .codec import default_codec
+
+_codec = default_codec()
+
+# interned values; unicode can't go through the builtin intern()
+_strings = {}
+
+
+def _intern(value):
+    if value is None:
+        return None
+    return _strings.setdefault(value, value)
+
+
+def _ref_id(ref):
+    # id of a nested {"id": ..., "links": [...]} reference
+    if isinstance(ref, dict):
+        return _intern(ref.get('id'))
+    return None
+
+
+class _Nested(object):
+    def __init__(self, key, default=None):
+        """
+        A field decoded from the stored json each time it's read
+        """
+        self.key = key
+        self.default = default
+
+    def __get__(self, obj, cls):
+        if obj is None:
+            return self
+        return obj.raw.get(self.key, self.default)
+
+
+class Resource(object):
+    __slots__ = ('_json', 'id', 'region')
+
+    def __init__(self, data, region=None):
+        """
+        :param data: resource dict, as returned by the API
+        :param region: region the resource belongs to, if known
+        """
+        self._json = _codec.dumps(data)
+        self.id = data.get('id')
+        self.region = _intern(region)
+        self._load(data)
+
+    def _load(self, data):
+        pass
+
+    @classmethod
+    def wrap(cls, items, region=None):
+        """
+        Return a generator of resources for an iterable of dicts
+        """
+        return (cls(item, region) for item in items)
+
+    @property
+    def raw(self):
+        """
+        A new copy of the resource dict
+        """
+        return _codec.loads(self._json)
+
+    @property
+    def raw_json(self):
+        return self._json
+
+    def __getstate__(self):
+        return (self.raw, self.region)
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    def __eq__(self, other):
+        return (type(self) is type(other) and self.id == other.id and
+                self.region == other.region)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((type(self), self.id, self.region))
+
+    def __repr__(self):
+        return '<%s %s>' % (type(self).__name__, self.id)
+
+
+class Server(Resource):
+    __slots__ = ('name', 'status', 'progress', 'flavor_id', 'image_id',
+                 'tenant_id', 'user_id', 'host_id', 'access_ipv4',
+                 'access_ipv6', 'created', 'updated')
+
+    addresses = _Nested('addresses', {})
+    metadata = _Nested('metadata', {})
+    links = _Nested('links', [])
+
+    def _load(self, data):
+        self.name = data.get('name')
+        self.status = _intern(data.get('status'))
+        self.progress = data.get('progress')
+        self.flavor_id = _ref_id(data.get('flavor'))
+        self.image_id = _ref_id(data.get('image'))
+        self.tenant_id = _intern(data.get('tenant_id'))
+        self.user_id = _intern(data.get('user_id'))
+        self.host_id = _intern(data.get('hostId'))
+        self.access_ipv4 = data.get('accessIPv4') or None
+        self.access_ipv6 = data.get('accessIPv6') or None
+        self.created = data.get('created')
+        self.updated = data.get('updated')
+
+    def ips(self):
+        """
+        All of the server's addresses, including the access IPs
+        """
+        ips = set()
+        for addrs in self.addresses.values():
+            for addr in addrs:
+                ips.add(addr['addr'])
+        for ip in (self.access_ipv4, self.access_ipv6):
+            if ip:
+                ips.add(ip)
+        return ips
+
+
+class Image(Resource):
+    __slots__ = ('name', 'status', 'progress', 'min_disk', 'min_ram',
+                 'server_id', 'created', 'updated')
+
+    metadata = _Nested('metadata', {})
+    links = _Nested('links', [])
+
+    def _load(self, data):
+        self.name = data.get('name')
+        self.status = _intern(data.get('status'))
+        self.progress = data.get('progress')
+        self.min_disk = data.get('minDisk')
+        self.min_ram = data.get('minRam')
+        self.server_id = (data.get('server') or {}).get('id')
+        self.created = data.get('created')
+        self.updated = data.get('updated')
+
+
+class Flavor(Resource):
+    __slots__ = ('name', 'ram', 'disk', 'vcpus')
+
+    links = _Nested('links', [])
+
+    def _load(self, data):
+        self.id = _intern(self.id)
+        self.name = _intern(data.get('name'))
+        self.ram = data.get('ram')
+        self.disk = data.get('disk')
+        self.vcpus = data.get('vcpus')
+
+
+class Domain(Resource):
+    __slots__ = ('name', 'ttl', 'email_address', 'account_id', 'created',
+                 'updated')
+
+    nameservers = _Nested('nameservers', [])
+    subdomains = _Nested('subdomains', {})
+
+    def _load(self, data):
+        self.name = data.get('name')
+        self.ttl = data.get('ttl')
+        self.email_address = _intern(data.get('emailAddress'))
+        self.account_id = _intern(data.get('accountId'))
+        self.created = data.get('created')
+        self.updated = data.get('updated')
+
+    @property
+    def records(self):
+        return [Record(rec, self.region) for rec in
+                self.raw.get('recordsList', {}).get('records', [])]
+
+
+class Record(Resource):
+    __slots__ = ('name', 'type', 'data', 'ttl', 'priority', 'created',
+                 'updated')
+
+    def _load(self, data):
+        self.name = data.get('name')
+        self.type = _intern(data.get('type'))
+        self.data = data.get('data')
+        self.ttl = data.get('ttl')
+        self.priority = data.get('priority')
+        self.created = data.get('created')
+        self.updated = data.get('updated')
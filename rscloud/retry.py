@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# Copyright 2012 litl, LLC. All Rights Reserved.
+
+import random
+import threading
+import time
+
+from .exceptions import RackspaceCircuitOpenError
+
+# http verbs that are safe to repeat
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS')
+
+# responses that indicate a transient API problem
+TRANSIENT_STATUS = (500, 502, 503, 504)
+
+
+class RetryPolicy(object):
+    def __init__(self, max_attempts=4, backoff=0.5, max_backoff=30.0,
+                 retry_status=TRANSIENT_STATUS, retry_post=False):
+        """
+        When, and how long to wait before, a failed request is repeated.
+
+        Delays grow exponentially from `backoff`, with full jitter so
+        clients that failed together don't all retry together.
+
+        :param max_attempts: total number of attempts of a request
+        :param backoff: base delay in seconds
+        :param max_backoff: maximum delay in seconds
+        :param retry_status: http status codes considered transient
+        :param retry_post: also retry POST requests. Individual requests can
+            opt in with retry=True instead.
+        """
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.retry_status = retry_status
+        self.retry_post = retry_post
+
+    def transient(self, status):
+        """
+        Is a failure with status (None for a connection error) worth
+        retrying
+        """
+        return status is None or status in self.retry_status
+
+    def should_retry(self, method, attempt, retry=None):
+        """
+        :param method: http verb of the request
+        :param attempt: number of attempts made so far
+        :param retry: caller override; True or False to force retries on or
+            off for this request
+        """
+        if attempt >= self.max_attempts:
+            return False
+        if retry is not None:
+            return retry
+        if method.upper() == 'POST':
+            return self.retry_post
+        return method.upper() in IDEMPOTENT_METHODS
+
+    def delay(self, attempt):
+        return random.uniform(0, min(self.max_backoff,
+                                     self.backoff * 2 ** (attempt - 1)))
+
+
+class CircuitBreaker(object):
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        """
+        Fail fast on hosts that keep failing.
+
+        After failure_threshold consecutive transient failures a host's
+        circuit opens, and requests to it raise RackspaceCircuitOpenError
+        without being sent. After reset_timeout a single trial request is
+        let through; success closes the circuit, failure re-opens it.
+
+        :param failure_threshold: consecutive failures that open a circuit
+        :param reset_timeout: seconds before an open circuit is retried
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        # host -> [consecutive failures, opened time or None, trial running]
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def before(self, host):
+        """
+        Check that a request to host may be sent
+        """
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is None or state[1] is None:
+                return
+            if state[2] or time.time() - state[1] < self.reset_timeout:
+                raise RackspaceCircuitOpenError('circuit open for %s' % host)
+            # half open, let this request through as the trial
+            state[2] = True
+
+    def success(self, host):
+        with self._lock:
+            self._hosts.pop(host, None)
+
+    def release(self, host):
+        """
+        A request let through by before() ended without telling whether the
+        host is healthy, e.g. it was rate limited. If it was the trial of a
+        half open circuit, let another request be the trial.
+        """
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is not None:
+                state[2] = False
+
+    def failure(self, host):
+        with self._lock:
+            state = self._hosts.setdefault(host, [0, None, False])
+            state[0] += 1
+            state[2] = False
+            if state[0] >= self.failure_threshold:
+                state[1] = time.time()
+
+    def is_open(self, host):
+        with self._lock:
+            state = self._hosts.get(host)
+            return state is not None and state[1] is not None
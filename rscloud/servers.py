@@ -1,8 +1,132 @@
 #!/usr/bin/env python
 # Copyright 2012 litl, LLC. All Rights Reserved.
 
-import json
+import threading
 import time
+from datetime import datetime, timedelta
+
+from .exceptions import RackspaceAPIError, RackspaceTimeoutError
+from .resources import Server, Image, Flavor
+from .util import Result, run_concurrently
+
+# Default page size when iterating over listings.
+DEFAULT_PAGE_SIZE = 100
+# The API caps the page size, and a short page marks the end of a listing,
+# so never ask for more than this.
+MAX_PAGE_SIZE = 1000
+
+# bounds of the seconds between status checks while waiting on servers
+MIN_POLL_INTERVAL = 5
+MAX_POLL_INTERVAL = 60
+
+# re-request this much history when polling for changes, to cover clock
+# skew between us and the API
+CHANGES_SINCE_OVERLAP = timedelta(seconds=60)
+
+# the status each server action settles in. The API moves a server out of
+# this status as soon as it accepts the action (e.g. to REBOOT), so waiting
+# for it can't finish before the action has run.
+ACTION_STATUS = {
+    'reboot': 'ACTIVE',
+    'rebuild': 'ACTIVE',
+    'resize': 'VERIFY_RESIZE',
+    'confirmResize': 'ACTIVE',
+    'revertResize': 'ACTIVE',
+    'rescue': 'RESCUE',
+    'unrescue': 'ACTIVE',
+    'changePassword': 'ACTIVE',
+    'delete': 'DELETED',
+}
+
+
+class _PageFetch(threading.Thread):
+    def __init__(self, fetch, marker):
+        """
+        Retrieve a page in the background, while the previous page is being
+        consumed.
+        """
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self._fetch = fetch
+        self._marker = marker
+        self._page = None
+        self._exc = None
+        self.start()
+
+    def run(self):
+        try:
+            self._page = self._fetch(self._marker)
+        except Exception as err:
+            self._exc = err
+
+    def result(self):
+        self.join()
+        if self._exc is not None:
+            raise self._exc
+        return self._page
+
+
+def _iter_pages(list_func, key, page_size, prefetch, **kwargs):
+    """
+    Follow the marker through a paginated listing, yielding one item at a
+    time.
+
+    :param list_func: listing method accepting marker and limit
+    :param key: key of the item list in the response body
+    :param page_size: number of items requested per call
+    :param prefetch: fetch the next page while the current one is consumed
+    """
+    page_size = min(int(page_size), MAX_PAGE_SIZE)
+
+    def fetch(marker):
+        return list_func(marker=marker, limit=page_size, **kwargs)[key]
+
+    page = fetch(None)
+    while page:
+        last_page = len(page) < page_size
+        next_page = None
+        if prefetch and not last_page:
+            next_page = _PageFetch(fetch, page[-1]['id'])
+
+        for item in page:
+            yield item
+
+        if last_page:
+            break
+        elif next_page is not None:
+            page = next_page.result()
+        else:
+            page = fetch(page[-1]['id'])
+
+
+class CreateResult(Result):
+    """
+    The outcome of one server creation in Servers.create_many.
+
+    `item` is the create spec, `value` the raw JSON returned by create, and
+    `server` the last server detail retrieved when waiting for the build.
+    """
+    server = None
+
+    @property
+    def server_id(self):
+        if self.value:
+            return self.value['server']['id']
+
+    @property
+    def admin_pass(self):
+        if self.value:
+            return self.value['server'].get('adminPass')
+
+
+class ActionResult(Result):
+    """
+    The outcome of one server action in Servers.action_many.
+
+    `item` is the server id, `value` the raw JSON returned by the action,
+    and `server` the last server detail retrieved when waiting for it.
+    """
+    server = None
 
 
 class Servers(object):
@@ -13,7 +137,7 @@ class Servers(object):
         :param session: rscloud.AuthenticatedSession
         """
         self._sess = session
-        self._url = (session.sc['cloudServersOpenStack']['publicURL'] +
+        self._url = (session.service_url('cloudServersOpenStack') +
                      '/servers')
 
     def create(self, name, imageRef, flavorRef, personality=None,
@@ -42,9 +166,175 @@ class Servers(object):
             req_body['personality'] = personality
 
         #TODO error handling
-        resp = self._sess.post(self._url, data=json.dumps(req_body))
+        resp = self._sess.post(self._url, data=req_body)
         return resp.json
 
+    def create_many(self, specs, concurrency=10, wait=False, timeout=None,
+                    interval=MIN_POLL_INTERVAL):
+        """
+        Create many cloud servers concurrently.
+
+        Failures are recorded in the individual results rather than raised,
+        so one bad spec doesn't abort the rest of the batch.
+
+        :param specs: list of create() arguments, each a dict of keyword
+            arguments or a sequence of positional arguments
+        :param concurrency: maximum number of create requests in flight
+        :param wait: wait for each server to become ACTIVE
+        :param timeout: total seconds to wait for the builds
+        :param interval: minimum seconds between status checks while
+            waiting
+        :returns: list of CreateResult, in the order of specs
+        """
+        def create(spec):
+            if isinstance(spec, dict):
+                return self.create(**spec)
+            return self.create(*spec)
+
+        results = run_concurrently(create, specs, concurrency,
+                                   result_class=CreateResult)
+        if wait:
+            building = dict((r.server_id, r) for r in results if r.ok)
+            self._wait_results(building, 'ACTIVE', timeout, interval)
+        return results
+
+    def action_many(self, action, servers, concurrency=10, wait=False,
+                    timeout=None, interval=MIN_POLL_INTERVAL, callback=None,
+                    **kwargs):
+        """
+        Apply a server action, such as reboot or resize, to many servers
+        concurrently.
+
+        Failures are recorded in the individual results rather than raised,
+        so one bad server doesn't abort the rest of the fleet.
+
+        :param action: name of the action method, one of ACTION_STATUS
+        :param servers: list of server ids, or a dict of server id to a dict
+            of extra keyword arguments for that server's action
+        :param concurrency: maximum number of action requests in flight
+        :param wait: wait for each server to settle in the action's
+            ACTION_STATUS
+        :param timeout: total seconds to wait for the servers
+        :param interval: minimum seconds between status checks while
+            waiting
+        :param callback: called with each ActionResult once it's final, to
+            report progress
+        :param kwargs: keyword arguments for every action call, e.g.
+            reboot_type='HARD'
+        :returns: list of ActionResult, in the order of servers
+        """
+        if action not in ACTION_STATUS:
+            raise ValueError('unknown server action %r' % action)
+        method = getattr(self, action)
+        extra = servers if isinstance(servers, dict) else {}
+
+        def act(server_id):
+            args = dict(kwargs, **extra.get(server_id, {}))
+            return method(server_id, **args)
+
+        def acted(result):
+            # without waiting, or when the action failed, this is final
+            if callback and (not wait or not result.ok):
+                callback(result)
+
+        results = run_concurrently(act, list(servers), concurrency,
+                                   result_class=ActionResult,
+                                   callback=acted)
+        if wait:
+            acting = dict((r.item, r) for r in results if r.ok)
+            self._wait_results(acting, ACTION_STATUS[action], timeout,
+                               interval, callback)
+        return results
+
+    def _wait_results(self, results, status, timeout, interval,
+                      callback=None):
+        # wait for the servers of a dict of server id to Result to reach
+        # status, recording the final detail or error in each result
+        try:
+            for server in self.wait_for(results, status, timeout, interval):
+                result = results.pop(server['id'])
+                result.server = server
+                if server['status'] == 'ERROR':
+                    result.error = RackspaceAPIError(
+                        'server %s in ERROR state' % server['id'])
+                if callback:
+                    callback(result)
+        except Exception as err:
+            # a timeout, or polling failed; either way the results, like
+            # the adminPass of created servers, are kept
+            for result in results.values():
+                result.error = err
+                if callback:
+                    callback(result)
+
+    def wait_for(self, server_ids, status='ACTIVE', timeout=None,
+                 interval=MIN_POLL_INTERVAL, max_interval=MAX_POLL_INTERVAL):
+        """
+        Wait for a set of servers to reach status, yielding the detail of
+        each server as it reaches status or ERROR.
+
+        The whole set is polled with a single listing per interval; after
+        the first, only servers changed since the previous poll are
+        requested. The interval shortens while builds are progressing, and
+        backs off while nothing changes.
+
+        :param server_ids: ids of the servers to wait for
+        :param status: status to wait for
+        :param timeout: total seconds to wait
+        :param interval: minimum seconds between polls
+        :param max_interval: maximum seconds between polls
+        """
+        pending = set(server_ids)
+        deadline = None
+        if timeout is not None:
+            deadline = time.time() + timeout
+        min_interval = interval
+        progress = {}
+        changes_since = None
+        while pending:
+            polled = datetime.utcnow() - CHANGES_SINCE_OVERLAP
+            kwargs = {'detail': True}
+            if changes_since:
+                kwargs['changes_since'] = changes_since
+            seen = set()
+            advanced = False
+            for server in self.iter_servers(**kwargs):
+                server_id = server['id']
+                if server_id not in pending:
+                    continue
+                seen.add(server_id)
+                if server['status'] in (status, 'ERROR'):
+                    pending.discard(server_id)
+                    advanced = True
+                    yield server
+                elif server.get('progress') != progress.get(server_id):
+                    progress[server_id] = server.get('progress')
+                    advanced = True
+
+            if changes_since is None and status == 'DELETED':
+                # deleted servers may already be gone from a full listing
+                for server_id in pending - seen:
+                    pending.discard(server_id)
+                    yield {'id': server_id, 'status': 'DELETED'}
+            changes_since = polled.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+            if not pending:
+                break
+            if deadline is not None and time.time() >= deadline:
+                raise RackspaceTimeoutError(
+                    'timed out waiting for servers %s to become %s' %
+                    (', '.join(sorted(pending)), status))
+
+            if advanced:
+                interval = max(min_interval, interval / 2.0)
+            else:
+                interval = min(max_interval, interval * 1.5)
+            if deadline is None:
+                time.sleep(interval)
+            else:
+                # poll one last time at the deadline, rather than after it
+                time.sleep(max(0, min(interval, deadline - time.time())))
+
     def delete(self, server_id):
         """
         Delete a cloud server
@@ -56,9 +346,13 @@ class Servers(object):
         return resp.json
 
     def list(self, image=None, flavor=None, name=None, status=None,
-             marker=None, limit=None, changes_since=None, detail=False):
+             marker=None, limit=None, changes_since=None, detail=False,
+             stream=False):
         """
         List all cloud servers
+
+        :param stream: parse the response incrementally, and return an
+            iterator over the servers instead of the whole response
         """
         if detail:
             url = self._url + '/detail'
@@ -83,9 +377,29 @@ class Servers(object):
         if detail:
             params['detail'] = detail
 
+        if stream:
+            return self._sess.iter_json(url, ('servers',), params=params)
+
         resp = self._sess.get(url, params=params)
         return resp.json
 
+    def iter_servers(self, detail=False, page_size=DEFAULT_PAGE_SIZE,
+                     prefetch=False, typed=False, **kwargs):
+        """
+        Iterate over all cloud servers, following the pagination marker.
+
+        :param detail: yield detailed server records
+        :param page_size: number of servers retrieved per request
+        :param prefetch: retrieve the next page in the background
+        :param typed: yield rscloud.Server objects instead of dicts
+        :param kwargs: filters passed through to list()
+        """
+        items = _iter_pages(self.list, 'servers', page_size, prefetch,
+                            detail=detail, **kwargs)
+        if typed:
+            return Server.wrap(items, self._sess.region)
+        return items
+
     def detail(self, server_id):
         """
         List details of cloud server
@@ -97,64 +411,69 @@ class Servers(object):
     def update(self):
         raise NotImplementedError
 
+    def limits(self):
+        """
+        Retrieve the rate and absolute limits of the account
+        """
+        url = self._url.rsplit('/', 1)[0] + '/limits'
+        resp = self._sess.get(url)
+        return resp.json
+
     # TODO: return something usefull from actions when there's no body
     def changePassword(self, serverId, password):
         url = self._url + '/' + serverId + '/action'
-        data = json.dumps({'changePassword': {'adminPass': password}})
+        data = {'changePassword': {'adminPass': password}}
         resp = self._sess.post(url, data=data)
         return resp.json
 
     def reboot(self, serverId, reboot_type='SOFT'):
         url = self._url + '/' + serverId + '/action'
-        data = json.dumps({'reboot': {'type': reboot_type}})
+        data = {'reboot': {'type': reboot_type}}
         resp = self._sess.post(url, data=data)
         return resp.json
 
     def rebuild(self, serverId, name, imageRef, flavorRef, personality=None,
                 metadata=None):
         url = self._url + '/' + serverId + '/action'
-        data = json.dumps({'rebuild': {'name': name,
-                                       'imageRef': imageRef,
-                                       'flavorRef': str(flavorRef),
-                                       'metadata': metadata,
-                                       'personality': personality}
-                           })
+        data = {'rebuild': {'name': name,
+                            'imageRef': imageRef,
+                            'flavorRef': str(flavorRef),
+                            'metadata': metadata,
+                            'personality': personality}}
         resp = self._sess.post(url, data=data)
         return resp.json
 
     def resize(self, serverId, flavorId):
         # API bug, resize.flavorRef only accepts flavorId
         url = self._url + '/' + serverId + '/action'
-        data = json.dumps({'resize': {
-                           'flavorRef': str(flavorId)}
-                           })
+        data = {'resize': {'flavorRef': str(flavorId)}}
         resp = self._sess.post(url, data=data)
         return resp.json
 
     def confirmResize(self, serverId):
         url = self._url + '/' + serverId + '/action'
-        data = json.dumps({'confirmResize': None})
+        data = {'confirmResize': None}
         resp = self._sess.post(url, data=data)
         return resp.json
 
     def revertResize(self, serverId):
         #TODO: can this be async?
         url = self._url + '/' + serverId + '/action'
-        data = json.dumps({'revertResize': None})
+        data = {'revertResize': None}
         resp = self._sess.post(url, data=data)
         return resp.json
 
     def rescue(self, serverId):
         # TODO: make a synchronous option
         url = self._url + '/' + serverId + '/action'
-        data = json.dumps({'rescue': "none"})
+        data = {'rescue': "none"}
         resp = self._sess.post(url, data=data)
         return resp.json
 
     def unrescue(self, serverId):
         # TODO: make a synchronous option
         url = self._url + '/' + serverId + '/action'
-        data = json.dumps({'unrescue': None})
+        data = {'unrescue': None}
         resp = self._sess.post(url, data=data)
         return resp.json
 
@@ -164,7 +483,9 @@ class Servers(object):
         data = {'createImage': {'name': name}}
         if metadata:
             data['metadata'] = metadata
-        resp = self._sess.post(url, data=json.dumps(data))
+        resp = self._sess.post(url, data=data)
+        # the new image shows up in the images collection
+        self._sess.invalidate(self._url.rsplit('/', 1)[0] + '/images')
         return resp.json
 
 
@@ -176,7 +497,7 @@ class Images(object):
         :param session: rscloud.AuthenticatedSession
         """
         self._sess = session
-        self._url = (session.sc['cloudServersOpenStack']['publicURL']
+        self._url = (session.service_url('cloudServersOpenStack')
                      + '/images')
 
     def detail(self, image_id):
@@ -228,6 +549,22 @@ class Images(object):
         resp = self._sess.get(url, params=params)
         return resp.json
 
+    def iter_images(self, detail=False, page_size=DEFAULT_PAGE_SIZE,
+                    prefetch=False, typed=False, **kwargs):
+        """
+        Iterate over all server images, following the pagination marker.
+
+        :param detail: yield detailed image records
+        :param page_size: number of images retrieved per request
+        :param prefetch: retrieve the next page in the background
+        :param typed: yield rscloud.Image objects instead of dicts
+        :param kwargs: filters passed through to list()
+        """
+        items = _iter_pages(self.list, 'images', page_size, prefetch,
+                            detail=detail, **kwargs)
+        if typed:
+            return Image.wrap(items, self._sess.region)
+        return items
 
     def delete(self, image_id):
         """
@@ -248,7 +585,7 @@ class Flavors(object):
         :param session: rscloud.AuthenticatedSession
         """
         self._sess = session
-        self._url = (session.sc['cloudServersOpenStack']['publicURL']
+        self._url = (session.service_url('cloudServersOpenStack')
                      + '/flavors')
 
     def list(self, minDisk=None, minRam=None, marker=None, limit=None,
@@ -277,6 +614,23 @@ class Flavors(object):
         resp = self._sess.get(url, params=params)
         return resp.json
 
+    def iter_flavors(self, detail=False, page_size=DEFAULT_PAGE_SIZE,
+                     prefetch=False, typed=False, **kwargs):
+        """
+        Iterate over all server flavors, following the pagination marker.
+
+        :param detail: yield detailed flavor records
+        :param page_size: number of flavors retrieved per request
+        :param prefetch: retrieve the next page in the background
+        :param typed: yield rscloud.Flavor objects instead of dicts
+        :param kwargs: filters passed through to list()
+        """
+        items = _iter_pages(self.list, 'flavors', page_size, prefetch,
+                            detail=detail, **kwargs)
+        if typed:
+            return Flavor.wrap(items, self._sess.region)
+        return items
+
     def detail(self, flavor_id):
         """
         Lists details of the specified flavor
@@ -1,8 +1,6 @@
 #!/usr/bin/env python
 # Copyright 2012 litl, LLC. All Rights Reserved.
 
-import json
-
 
 class FirstGenServers(object):
     def __init__(self, session):
@@ -12,7 +10,7 @@ class FirstGenServers(object):
         :param session: rscloud.AuthenticatedSession
         """
         self._sess = session
-        self.url = session.sc['cloudServers']['publicURL'] + '/servers'
+        self.url = session.service_url('cloudServers') + '/servers'
 
     def create(self, name, image, flavor, personality=None):
         """
@@ -33,7 +31,7 @@ class FirstGenServers(object):
                                'personality': personality}
                     }
 
-        resp = self._sess.post(self.url, data=json.dumps(req_body))
+        resp = self._sess.post(self.url, data=req_body)
         return resp.json
 
     def delete(self, server_id):
@@ -53,15 +51,19 @@ class FirstGenServers(object):
         resp = self._sess.get(self.url)
         return resp.json
 
-    def detail(self, server_id=None):
+    def detail(self, server_id=None, stream=False):
         """
         List details of cloud servers
 
         :param server_id: id of server to detail. If server_id is None, detail
             all servers.
+        :param stream: when detailing all servers, parse the response
+            incrementally and return an iterator over the servers
         """
         if not server_id:
             url = self.url + '/detail'
+            if stream:
+                return self._sess.iter_json(url, ('servers',))
         else:
             url = self.url + '/' + str(server_id)
 
@@ -77,7 +79,7 @@ class FirstGenImages(object):
         :param session: rscloud.AuthenticatedSession
         """
         self._sess = session
-        self.url = session.sc['cloudServers']['publicURL'] + '/images'
+        self.url = session.service_url('cloudServers') + '/images'
 
     def detail(self, image_id):
         """
@@ -107,7 +109,7 @@ class FirstGenImages(object):
                               'name': name}
                     }
 
-        resp = self._sess.post(self.url, data=json.dumps(req_body))
+        resp = self._sess.post(self.url, data=req_body)
         return resp.json
 
     def delete(self, image_id):
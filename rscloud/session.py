@@ -1,36 +1,123 @@
 #!/usr/bin/env python
 # Copyright 2012 litl, LLC. All Rights Reserved.
 
-import json
+import copy
 import os
-import requests
+import threading
+import time
+import urllib
+import zlib
+from functools import partial
 from datetime import datetime
-from dateutil.parser import parse as dt_parse
 
-from .exceptions import RackspaceAuthError, RackspaceAPIError
+from .exceptions import (RackspaceAuthError, RackspaceAPIError,
+                         RackspaceServiceError)
+from .ratelimit import parse_retry_after
+from .retry import RetryPolicy, TRANSIENT_STATUS
+from .transport import Transport
+from .metrics import url_template
+from .codec import JSONResponse, default_codec
+from .jsonstream import iter_items
 
 AUTH_URL = 'https://identity.api.rackspacecloud.com/v2.0/'
 
+# responses when the API rate limits are exceeded
+RATE_LIMIT_STATUS = (413, 429)
+MAX_RATE_LIMIT_RETRIES = 3
+# seconds to wait when a rate limited response has no Retry-After
+DEFAULT_RETRY_AFTER = 5
+
+# rejected because the token expired or was revoked; the request is retried
+# once with a new token
+UNAUTHORIZED_STATUS = 401
+
+# request bodies smaller than this aren't worth compressing
+COMPRESS_MIN_SIZE = 1024
+COMPRESS_LEVEL = 6
+
+# bytes read at a time from streamed responses
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# retry idempotent requests on transient errors
+DEFAULT_RETRY_POLICY = RetryPolicy()
+
+
+def gzip_body(data):
+    """
+    Compress a request body in gzip format
+    """
+    if isinstance(data, unicode):
+        data = data.encode('utf-8')
+    compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED,
+                                  16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
 class AuthenticatedSession(object):
-    def __init__(self):
+    def __init__(self, token_cache=None, cache=None, rate_limiter=None,
+                 retry_policy=DEFAULT_RETRY_POLICY,
+                 circuit_breaker=None, transport=None, metrics=None,
+                 codec=None, coalescer=None, compress_requests=False):
         """
         An authenticated session for the rackspace api.
+
+        A session can be shared by any number of threads. When the token
+        needs refreshing, one thread logs in while the others wait for it.
+
+        :param token_cache: rscloud.TokenCache used to share tokens between
+            processes
+        :param cache: rscloud.ResponseCache for GET responses
+        :param rate_limiter: rscloud.RateLimiter applied to every request.
+            Rate limited requests are retried after the Retry-After time.
+        :param retry_policy: rscloud.RetryPolicy for transient errors, or
+            None to never retry
+        :param circuit_breaker: rscloud.CircuitBreaker to fail fast on
+            failing hosts
+        :param transport: rscloud.Transport to share connection pools with
+            other sessions
+        :param metrics: rscloud.Metrics to record every request in
+        :param codec: json codec for request and response bodies, defaults
+            to the fastest available
+        :param coalescer: rscloud.RequestCoalescer to share the response of
+            identical concurrent GETs
+        :param compress_requests: gzip request bodies of at least
+            COMPRESS_MIN_SIZE bytes. Only enable this if the endpoints used
+            accept gzip encoded bodies; it can also be set per request with
+            compress=True/False. Responses are always accepted compressed.
         """
         self.username = None
         self.password = None
         self.api_key = None
         self.region = None
         self.auth_url = None
+        self.auth_token = None
+        self.token_cache = token_cache
+        self._cache_key = None
+        self._refresh_at = None
+        # held while logging in, so only one thread refreshes the token
+        self._auth_lock = threading.RLock()
+        self.cache = cache
+        self.rate_limiter = rate_limiter
+        self.retry_policy = retry_policy
+        self.circuit_breaker = circuit_breaker
+        self.metrics = metrics
+        self.coalescer = coalescer
+        self.compress_requests = compress_requests
+        if codec is None:
+            codec = default_codec()
+        self.codec = codec
 
         self.sc = {}  # service catalog
-        self.session = requests.session()
+        if transport is None:
+            # rackspace api has lots of connection errors, the Transport
+            # retries them 3 times
+            transport = Transport()
+        self.transport = transport
+        self.session = transport.session()
         self.session.headers = {'Content-Type': 'application/json',
-                                'Accept': 'application/json'}
-        # rackspace api has lots of connection errors
-        # retry 3 times
-        self.session.config['max_retries'] = 3
+                                'Accept': 'application/json',
+                                'Accept-Encoding': 'gzip, deflate'}
 
-    def login(self, username, api_key=None, password=None,
+    def login(self, username=None, api_key=None, password=None,
               region=None, auth_url=None):
         """
         Authenticate the current session with the rackspace auth servers, and
@@ -38,6 +125,15 @@ class AuthenticatedSession(object):
 
 
         """
+        with self._auth_lock:
+            self._login(username, api_key, password, region, auth_url)
+
+    def _login(self, username, api_key, password, region, auth_url):
+        started = time.time()
+
+        if username or region or auth_url:
+            # the token cache entry depends on these
+            self._cache_key = None
 
         if username:
             self.username = username
@@ -56,6 +152,27 @@ class AuthenticatedSession(object):
         elif not self.auth_url:
             self.auth_url = AUTH_URL
 
+        if self.token_cache is not None:
+            if self._cache_key is None:
+                # key on the region asked for, before _load_access fills in
+                # the default region, so refreshes keep using the entry
+                # every process configured like this one shares
+                self._cache_key = self.token_cache.key(
+                    self.username, self.auth_url, self.region)
+            access = self.token_cache.get(self._cache_key,
+                                          self._authenticate)
+            self._refresh_at = self.token_cache.refresh_time(access)
+        else:
+            access = self._authenticate()
+
+        self._load_access(access)
+
+        if self.metrics is not None:
+            self.metrics.record_login(time.time() - started)
+
+    def _authenticate(self):
+        # request a new token from the auth servers, returning the access
+        # section of the response
         if self.password:
             auth_data = {"auth":
                             {"passwordCredentials":
@@ -74,84 +191,366 @@ class AuthenticatedSession(object):
             raise RackspaceAuthError('No password or api_key defined')
 
         resp = self.session.post(self.auth_url+'/tokens',
-                                 data=json.dumps(auth_data))
+                                 data=self.codec.dumps(auth_data))
         if resp.status_code != 200:
             raise RackspaceAuthError(resp.status_code, resp.content)
 
-        self.auth_token = resp.json['access']['token']
-        self.auth_user = resp.json['access']['user']
+        return self.codec.loads(resp.content)['access']
+
+    def _load_access(self, access):
+        # setup the session from the access section of an auth response.
+        # Other threads may be sending requests, so everything is built
+        # first, and then swapped in.
+        token = access['token']
+        user = access['user']
 
         if not self.region:
-            self.region = self.auth_user['RAX-AUTH:defaultRegion']
+            self.region = user['RAX-AUTH:defaultRegion']
         if not self.region:
             raise RackspaceAPIError('No default region found')
 
+        # dateutil is only imported once needed, to keep imports fast
+        from dateutil.parser import parse as dt_parse
+
         # parse the expires time into a utc time tuple, as dealing with tz
         # offsets is a pain.
-        self.expires = dt_parse(self.auth_token['expires']).utctimetuple()
+        expires = dt_parse(token['expires']).utctimetuple()
 
-        self.session.headers['X-Auth-Token'] = self.auth_token['id']
-
-        #from now on, raise all errors
-        self.session.config['danger_mode'] = True
-
-        service_catalog = resp.json['access']['serviceCatalog']
-
-        # bind this to the session for debugging later
-        self.service_catalog = service_catalog
+        service_catalog = access['serviceCatalog']
 
         # flatten the endpoint for our region into the sc[service] dict,
         # keyed by service name
+        sc = {}
         for svc in service_catalog:
             service = svc['name']
-            self.sc[service] = {}
-            self.sc[service]['type'] = svc['type']
+            sc[service] = {}
+            sc[service]['type'] = svc['type']
             for ep in svc['endpoints']:
                 if not self.region:
                     # don't know what region to pick, take the first
-                    self.sc[service].update(ep)
+                    sc[service].update(ep)
                 elif 'region' in ep and self.region == ep['region']:
-                    self.sc[service].update(ep)
+                    sc[service].update(ep)
                 elif 'region' not in ep:
-                    self.sc[service].update(ep)
+                    sc[service].update(ep)
+
+        headers = dict(self.session.headers)
+        headers['X-Auth-Token'] = token['id']
+
+        #from now on, raise all errors
+        self.session.config['danger_mode'] = True
+
+        self._access = access
+        self.auth_user = user
+        # bind this to the session for debugging later
+        self.service_catalog = service_catalog
+        self.sc = sc
+        self.expires = expires
+        self.session.headers = headers
+        self.auth_token = token
 
     def _check_auth(self):
         # make sure we have an auth token, and it's not expired
-        if not self.auth_token:
+        token = self.auth_token
+        if not token:
             raise RackspaceAuthError('Not logged in')
         if datetime.utcnow().timetuple() > self.expires:
-            self.login()
+            self._refresh(token)
+        elif (self.token_cache is not None and
+              time.time() >= self._refresh_at):
+            # refresh early, through the cache, before the token expires
+            self._refresh(token)
+
+    def _refresh(self, token, revoked=False):
+        # login again, unless another thread already replaced token while
+        # we waited for the lock
+        with self._auth_lock:
+            if self.auth_token is not token:
+                return
+            if (revoked and self.token_cache is not None and
+                    self._cache_key is not None):
+                # the cached entry may still look fresh, drop it so the
+                # login goes to the identity service
+                self.token_cache.invalidate(self._cache_key, token['id'])
+            self._login(None, None, None, None, None)
 
     def check_callback(self, resp, details=False):
         resp = self.get(resp['callbackUrl'])
         print resp.json
 
+    def regions(self, service=None):
+        """
+        All regions in the service catalog
+
+        :param service: only regions with an endpoint for this service
+        """
+        regions = set()
+        for svc in self.service_catalog:
+            if service is not None and svc['name'] != service:
+                continue
+            for ep in svc['endpoints']:
+                if 'region' in ep:
+                    regions.add(ep['region'])
+        return sorted(regions)
+
+    def for_region(self, region):
+        """
+        A new session for another region, reusing our token and service
+        catalog instead of authenticating again. The connection pools,
+        caches, metrics and retry policies are shared; rate limits apply per
+        region, so the rate limiter isn't.
+        """
+        if not self.auth_token:
+            raise RackspaceAuthError('Not logged in')
+        # a copy keeps the type and settings of subclasses too, then the
+        # state that belongs to a single session is replaced
+        session = copy.copy(self)
+        session._auth_lock = threading.RLock()
+        session._cache_key = None
+        session.rate_limiter = None
+        session.session = self.transport.session()
+        session.session.headers = dict(self.session.headers)
+        session.region = region
+        session._load_access(self._access)
+        return session
+
+    def service_url(self, service):
+        """
+        The public endpoint of a service in our region
+
+        :raises: RackspaceServiceError if the service isn't in the catalog
+        """
+        url = self.sc.get(service, {}).get('publicURL')
+        if not url:
+            raise RackspaceServiceError('%s is not available in region %s' %
+                                        (service, self.region))
+        return url
+
+    def invalidate(self, url):
+        """
+        Drop any cached or shared responses for the resource collection
+        containing url
+        """
+        if self.cache is None and self.coalescer is None:
+            return
+        prefix = self._collection_url(url)
+        if self.cache is not None:
+            self.cache.invalidate(prefix)
+        if self.coalescer is not None:
+            self.coalescer.invalidate(prefix)
+
+    def _collection_url(self, url):
+        # the top level resource collection of url, e.g. .../v2/123/images
+        service, path = self._split_url(url)
+        if service is None:
+            return url.rsplit('/', 1)[0]
+        return self.sc[service]['publicURL'] + '/' + path.split('/')[1]
+
+    def _split_url(self, url):
+        # split url into the service it belongs to, and the path below the
+        # service endpoint
+        path = url.split('?', 1)[0]
+        for service, ep in self.sc.items():
+            base = ep.get('publicURL')
+            if base and path.startswith(base + '/'):
+                return service, path[len(base):]
+        return None, path
+
+    def _limit_uris(self, url, path, params):
+        # the request uri with its query string, both below the service
+        # endpoint and in full, as rate limit regexes are written for either
+        full = '/' + url.split('/', 3)[3].split('?', 1)[0]
+        query = url.split('?', 1)[1] if '?' in url else ''
+        if hasattr(params, 'items'):
+            encoded = urllib.urlencode([(k, v) for k, v in
+                                        sorted(params.items())
+                                        if v is not None], doseq=True)
+            query = '&'.join(q for q in (query, encoded) if q)
+        if query:
+            return (path + '?' + query, full + '?' + query)
+        return (path, full)
+
     # delegate the http verbs to the request object
-    # TODO: retry on various transient errors
     def get(self, url, **kwargs):
-        self._check_auth()
-        try:
-            return self.session.get(url, **kwargs)
-        except requests.HTTPError as err:
-            raise RackspaceAPIError(err.response.text)
+        if self.cache is not None:
+            return self.cache.get(url, kwargs, self._get)
+        return self._get(url, **kwargs)
+
+    def _get(self, url, **kwargs):
+        if self.coalescer is not None:
+            return self.coalescer.get(url, kwargs,
+                                      partial(self._request, 'GET'))
+        return self._request('GET', url, **kwargs)
+
+    def iter_json(self, url, path, **kwargs):
+        """
+        GET url, and incrementally parse the response body, yielding each
+        element of the array at path as soon as it's decoded. The response
+        is never held in memory as a whole, and isn't cached.
+
+        :param path: sequence of object keys leading to the array, e.g.
+            ('servers',)
+        """
+        resp = self._request('GET', url, prefetch=False, **kwargs)
+        return iter_items(resp.iter_content(STREAM_CHUNK_SIZE), path)
 
     def post(self, url, data=None, **kwargs):
-        self._check_auth()
-        try:
-            return self.session.post(url, data=data, **kwargs)
-        except requests.HTTPError as err:
-            raise RackspaceAPIError(err.response.text)
+        resp = self._request('POST', url, data=data, **kwargs)
+        self.invalidate(url)
+        return resp
 
     def put(self, url, data=None, **kwargs):
-        self._check_auth()
-        try:
-            return self.session.put(url, data=data, **kwargs)
-        except requests.HTTPError as err:
-            raise RackspaceAPIError(err.response.text)
+        resp = self._request('PUT', url, data=data, **kwargs)
+        self.invalidate(url)
+        return resp
 
     def delete(self, url, **kwargs):
-        self._check_auth()
-        try:
-            return self.session.delete(url, **kwargs)
-        except requests.HTTPError as err:
-            raise RackspaceAPIError(err.response.text)
+        resp = self._request('DELETE', url, **kwargs)
+        self.invalidate(url)
+        return resp
+
+    def _request(self, method, url, retry=None, compress=None, **kwargs):
+        # Send a request, retrying transient failures according to
+        # retry_policy, and rate limited requests according to rate_limiter.
+        # retry=True/False overrides the retry policy for this request, and
+        # compress=True/False the compress_requests setting.
+        metrics = self.metrics
+        if metrics is not None:
+            started = time.time()
+            self._check_auth()
+            metrics.record_auth_check(time.time() - started)
+        else:
+            self._check_auth()
+
+        data = kwargs.get('data')
+        if data is not None and not isinstance(data, basestring):
+            # encode request bodies once, here, with the session codec
+            kwargs['data'] = data = self.codec.dumps(data)
+
+        # size of the body before any compression, for the metrics
+        body_size = len(data) if isinstance(data, basestring) else 0
+        if compress is None:
+            compress = self.compress_requests
+        compressed = compress and body_size >= COMPRESS_MIN_SIZE
+        if compressed:
+            kwargs['data'] = gzip_body(data)
+
+        import requests
+
+        service, path = self._split_url(url)
+        if self.rate_limiter is not None:
+            limit_uris = self._limit_uris(url, path, kwargs.get('params'))
+        host = url.split('/')[2]
+        attempt = 0
+        rate_limited = 0
+        reauthorized = False
+        while True:
+            if self.circuit_breaker is not None:
+                self.circuit_breaker.before(host)
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire(service, method, limit_uris)
+
+            attempt += 1
+            started = time.time()
+            # send the token we'd refresh if this request is unauthorized
+            token = self.auth_token
+            headers = dict(kwargs.get('headers') or {})
+            headers['X-Auth-Token'] = token['id']
+            if compressed:
+                headers['Content-Encoding'] = 'gzip'
+            try:
+                resp = self.session.request(method, url,
+                                            **dict(kwargs, headers=headers))
+                status = resp.status_code
+                error = None
+            except requests.HTTPError as err:
+                error = err
+                resp = err.response
+                status = resp.status_code
+            except requests.RequestException as err:
+                # connection errors have already been through the
+                # session max_retries
+                error = err
+                resp = None
+                status = None
+
+            if metrics is not None:
+                self._record(metrics, method, service, path, url, status,
+                             started, attempt, kwargs.get('data'), body_size,
+                             resp, error, kwargs.get('prefetch') is False)
+
+            if error is None:
+                if self.circuit_breaker is not None:
+                    self.circuit_breaker.success(host)
+                return JSONResponse(resp, self.codec)
+
+            if (self.rate_limiter is not None and
+                    status in RATE_LIMIT_STATUS and
+                    rate_limited < MAX_RATE_LIMIT_RETRIES):
+                # over the limit; hold back every request sharing this
+                # limit, and try again once the API allows it
+                rate_limited += 1
+                attempt -= 1
+                if self.circuit_breaker is not None:
+                    self.circuit_breaker.release(host)
+                wait = parse_retry_after(resp.headers.get('retry-after'))
+                if wait is None:
+                    wait = DEFAULT_RETRY_AFTER
+                self.rate_limiter.retry_after(service, method, limit_uris,
+                                              wait)
+                time.sleep(wait)
+                continue
+
+            if status == UNAUTHORIZED_STATUS and not reauthorized:
+                reauthorized = True
+                attempt -= 1
+                if self.circuit_breaker is not None:
+                    self.circuit_breaker.release(host)
+                self._refresh(token, revoked=True)
+                continue
+
+            policy = self.retry_policy
+            if policy is not None:
+                transient = policy.transient(status)
+            else:
+                # still a failure of the host, even when it isn't retried
+                transient = status is None or status in TRANSIENT_STATUS
+            if self.circuit_breaker is not None:
+                if transient:
+                    self.circuit_breaker.failure(host)
+                else:
+                    # the host is answering, the request was just bad
+                    self.circuit_breaker.success(host)
+
+            if (transient and policy is not None and
+                    policy.should_retry(method, attempt, retry)):
+                time.sleep(policy.delay(attempt))
+                continue
+
+            if resp is None:
+                raise error
+            raise RackspaceAPIError(resp.text)
+
+    def _record(self, metrics, method, service, path, url, status, started,
+                attempt, data, body_size, resp, error, streamed=False):
+        # byte counts are as sent over the wire, and before compression
+        sent = 0
+        if isinstance(data, basestring):
+            sent = len(data)
+        received = received_uncompressed = 0
+        if resp is not None:
+            length = resp.headers.get('content-length')
+            if streamed:
+                # don't consume a streamed body, go by what the server says
+                received = received_uncompressed = int(length or 0)
+            else:
+                received = received_uncompressed = len(resp.content or '')
+                if length and resp.headers.get('content-encoding'):
+                    received = int(length)
+        if error is not None:
+            error = str(error)
+        metrics.record_request(method, url_template(service, path), url,
+                               status, started, time.time() - started,
+                               attempt, sent, received, error,
+                               sent_uncompressed=body_size,
+                               received_uncompressed=received_uncompressed)
@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+# Copyright 2012 litl, LLC. All Rights Reserved.
+
+import json
+import unittest
+
+from .jsonstream import iter_items
+
+
+def _chunked(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+class IterItemsTest(unittest.TestCase):
+    def assertItems(self, doc, path, expected):
+        text = json.dumps(doc)
+        for size in range(1, len(text) + 1):
+            self.assertEqual(list(iter_items(_chunked(text, size), path)),
+                             expected, 'chunk size %d' % size)
+
+    def test_numbers_across_chunks(self):
+        self.assertItems({'servers': [-2.5e10, 1, 0.125, -7, 3E-2]},
+                         ('servers',), [-2.5e10, 1, 0.125, -7, 3E-2])
+
+    def test_nested(self):
+        records = [{'id': 'A-6822994', 'data': 'a, ] "b"'}, [1, {}], None,
+                   True, u'\xe9']
+        doc = {'totalEntries': 2, 'recordsList': {'records': records}}
+        self.assertItems(doc, ('recordsList', 'records'), records)
+
+    def test_missing_array(self):
+        self.assertItems({'servers': []}, ('images',), [])
+        self.assertItems({'servers': []}, ('servers',), [])
+
+    def test_truncated(self):
+        for text in ('{"servers": [1, 2', '{"servers": ', '{"serv',
+                     '{"images": [], "servers'):
+            for size in (1, 3, 100):
+                chunks = _chunked(text, size)
+                self.assertRaises(ValueError, list,
+                                  iter_items(chunks, ('servers',)))
+
+
+if __name__ == '__main__':
+    unittest.main()
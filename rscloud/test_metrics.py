@@ -0,0 +1,31 @@
+#!/usr/bin/env python
+# Copyright 2012 litl, LLC. All Rights Reserved.
+
+import unittest
+
+from .metrics import url_template
+
+
+class UrlTemplateTest(unittest.TestCase):
+    def test_ids(self):
+        cases = [
+            ('/servers/12345', '/servers/{id}'),
+            ('/servers/acf05b3c-5403-4cf0-900c-9b12b0db0644/action',
+             '/servers/{id}/action'),
+            ('/domains/3398741/records/A-6822994',
+             '/domains/{id}/records/{id}'),
+            ('/domains/3398741/records/NS-6251982',
+             '/domains/{id}/records/{id}'),
+        ]
+        for path, template in cases:
+            self.assertEqual(url_template('svc', path), 'svc:' + template)
+
+    def test_names_kept(self):
+        self.assertEqual(url_template('svc', '/servers/detail'),
+                         'svc:/servers/detail')
+        self.assertEqual(url_template(None, '/domains/search'),
+                         'unknown:/domains/search')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# Copyright 2012 litl, LLC. All Rights Reserved.
+
+import calendar
+import json
+import os
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # no file locking available (windows), processes may race to refresh
+    fcntl = None
+
+DEFAULT_PATH = os.path.join('~', '.rscloud', 'tokens.json')
+
+# refresh tokens this many seconds before they expire
+DEFAULT_REFRESH_MARGIN = 300
+
+# Identity may hand back the same token until it actually expires, so don't
+# ask again more often than this while inside the refresh margin.
+DEFAULT_RECHECK_INTERVAL = 60
+
+
+def _expires(access):
+    # token expiration as a utc timestamp
+    from dateutil.parser import parse as dt_parse
+    expires = dt_parse(access['token']['expires']).utctimetuple()
+    return calendar.timegm(expires)
+
+
+class TokenCache(object):
+    def __init__(self, path=DEFAULT_PATH,
+                 refresh_margin=DEFAULT_REFRESH_MARGIN,
+                 recheck_interval=DEFAULT_RECHECK_INTERVAL):
+        """
+        On-disk cache of auth tokens and service catalogs, shared between
+        processes.
+
+        Entries are keyed by username, auth url and region. Reads and
+        refreshes are serialized with a lock file, so when a token nears
+        expiration only one process re-authenticates, and the others pick
+        up its new token.
+
+        :param path: cache file location
+        :param refresh_margin: seconds before expiration to refresh a token
+        :param recheck_interval: minimum seconds between refresh attempts
+        """
+        self.path = os.path.expanduser(path)
+        self.refresh_margin = refresh_margin
+        self.recheck_interval = recheck_interval
+
+    def key(self, username, auth_url, region):
+        return '%s|%s|%s' % (username, auth_url.rstrip('/'), region or '')
+
+    def get(self, key, authenticate):
+        """
+        Return the cached access data for key, calling authenticate() to
+        replace it if it's missing or due for a refresh.
+
+        :param key: cache key from TokenCache.key()
+        :param authenticate: function returning new access data
+        """
+        entry = self._read().get(key)
+        if self._fresh(entry):
+            return entry['access']
+
+        with self._lock():
+            # another process may have refreshed while we waited
+            entries = self._read()
+            entry = entries.get(key)
+            if self._fresh(entry):
+                return entry['access']
+
+            access = authenticate()
+            entries[key] = {'access': access, 'fetched': time.time()}
+            self._write(entries)
+            return access
+
+    def refresh_time(self, access):
+        """
+        The time at which a session using access should check for a new
+        token.
+        """
+        return max(_expires(access) - self.refresh_margin,
+                   time.time() + self.recheck_interval)
+
+    def invalidate(self, key, token_id=None):
+        """
+        Remove an entry, e.g. when its token has been revoked
+
+        :param token_id: only remove the entry if it still holds this
+            token, and not one another process has fetched since
+        """
+        with self._lock():
+            entries = self._read()
+            entry = entries.get(key)
+            if entry is None:
+                return
+            if (token_id is not None and
+                    entry['access']['token']['id'] != token_id):
+                return
+            del entries[key]
+            self._write(entries)
+
+    def _fresh(self, entry):
+        if not entry:
+            return False
+        now = time.time()
+        expires = _expires(entry['access'])
+        if now >= expires:
+            return False
+        return (now < expires - self.refresh_margin or
+                now < entry['fetched'] + self.recheck_interval)
+
+    def _read(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def _write(self, entries):
+        # write to a private temp file, and rename into place so readers
+        # never see a partial file
+        tmp_path = '%s.%d.tmp' % (self.path, os.getpid())
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(entries, f)
+        os.rename(tmp_path, self.path)
+
+    @contextmanager
+    def _lock(self):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory, 0o700)
+
+        if fcntl is None:
+            yield
+            return
+
+        fd = os.open(self.path + '.lock', os.O_WRONLY | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
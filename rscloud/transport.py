@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+# Copyright 2012 litl, LLC. All Rights Reserved.
+
+import threading
+
+# number of hosts to keep connection pools for
+DEFAULT_POOL_CONNECTIONS = 10
+# connections kept open per host; should be at least the number of threads
+# making requests, or connections are discarded and re-established
+DEFAULT_POOL_MAXSIZE = 32
+
+
+class Transport(object):
+    def __init__(self, pool_connections=DEFAULT_POOL_CONNECTIONS,
+                 pool_maxsize=DEFAULT_POOL_MAXSIZE, keep_alive=True,
+                 max_retries=3):
+        """
+        Connection pools shared by any number of sessions.
+
+        Each AuthenticatedSession keeps its own headers and auth token, but
+        sessions created from the same Transport (e.g. one per region or
+        account) reuse the same keep-alive connections.
+
+        :param pool_connections: number of hosts to keep pools for
+        :param pool_maxsize: maximum connections kept per host
+        :param keep_alive: reuse connections between requests
+        :param max_retries: retries on connection errors
+        """
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.keep_alive = keep_alive
+        self.max_retries = max_retries
+        self._poolmanager = None
+        self._lock = threading.Lock()
+
+    def session(self):
+        """
+        Create a requests session using the shared connection pools
+        """
+        import requests
+
+        config = {'pool_connections': self.pool_connections,
+                  'pool_maxsize': self.pool_maxsize,
+                  'keep_alive': self.keep_alive,
+                  'max_retries': self.max_retries}
+        session = requests.session(config=config)
+        with self._lock:
+            if self._poolmanager is None:
+                self._poolmanager = session.poolmanager
+            else:
+                session.poolmanager = self._poolmanager
+        return session
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# Copyright 2012 litl, LLC. All Rights Reserved.
+
+
+class Result(object):
+    def __init__(self, item):
+        """
+        The outcome of applying an operation to a single item
+
+        :param item: the input the operation was applied to
+        """
+        self.item = item
+        self.value = None
+        self.error = None
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        if self.ok:
+            return '<%s %r ok>' % (self.__class__.__name__, self.item)
+        return '<%s %r error: %r>' % (self.__class__.__name__, self.item,
+                                      self.error)
+
+
+def run_concurrently(func, items, concurrency, result_class=Result,
+                     callback=None):
+    """
+    Call func(item) for each item, with at most `concurrency` calls running
+    at once. Errors are collected rather than raised.
+
+    :param func: function applied to each item
+    :param items: iterable of inputs
+    :param concurrency: maximum number of worker threads
+    :param result_class: Result subclass used to record each outcome
+    :param callback: called with each Result as it completes, from the
+        worker thread
+    :returns: list of Result, in the order of items
+    """
+    results = [result_class(item) for item in items]
+    if not results:
+        return results
+
+    def work(result):
+        try:
+            result.value = func(result.item)
+        except Exception as err:
+            result.error = err
+        if callback:
+            callback(result)
+
+    from multiprocessing.pool import ThreadPool
+    pool = ThreadPool(max(1, min(int(concurrency), len(results))))
+    try:
+        pool.map(work, results, chunksize=1)
+    finally:
+        # All the work is done once map returns. Joining would only wait
+        # for the pool's housekeeping threads, which poll every 0.1s.
+        pool.close()
+    return results
@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+# Copyright 2012 litl, LLC. All Rights Reserved.
+
+from .exceptions import RackspaceAPIError
+from .jobs import JobPoller
+
+# record fields compared, and sent, besides name/type/data
+OPTIONAL_FIELDS = ('ttl', 'priority', 'comment')
+
+# NS records at the zone apex are managed by Rackspace, so they're left
+# alone unless asked for
+DEFAULT_IGNORE_TYPES = ('NS',)
+
+
+def _key(record):
+    return (record['name'].lower().rstrip('.'), record['type'].upper(),
+            record['data'])
+
+
+def _changed_fields(current, desired):
+    # fields set in the desired record that differ from the current one
+    return dict((field, desired[field]) for field in OPTIONAL_FIELDS
+                if desired.get(field) is not None and
+                desired[field] != current.get(field))
+
+
+class ChangeSet(object):
+    def __init__(self, domain_id):
+        """
+        The changes needed to bring a domain's records to a desired state.
+
+        adds are new record dicts, modifies are record dicts including the
+        existing record id, and removes are the current records to delete.
+        """
+        self.domain_id = domain_id
+        self.adds = []
+        self.modifies = []
+        self.removes = []
+        # jobs started when the changes were applied
+        self.jobs = []
+
+    @property
+    def empty(self):
+        return not (self.adds or self.modifies or self.removes)
+
+    @property
+    def ok(self):
+        """
+        Did every job started so far succeed
+        """
+        return all(job.ok for job in self.jobs)
+
+    def describe(self):
+        """
+        Return a line of text for each change
+        """
+        lines = []
+        for rec in self.removes:
+            lines.append('- %s %s %s' % (rec['name'], rec['type'],
+                                         rec['data']))
+        for rec in self.modifies:
+            changed = ' '.join('%s=%s' % (field, rec[field])
+                               for field in ('data',) + OPTIONAL_FIELDS
+                               if field in rec)
+            lines.append('~ %s %s %s (%s)' % (rec['name'], rec['type'],
+                                              changed, rec['id']))
+        for rec in self.adds:
+            lines.append('+ %s %s %s' % (rec['name'], rec['type'],
+                                         rec['data']))
+        return lines
+
+    def __repr__(self):
+        return '<ChangeSet %s +%d ~%d -%d>' % (
+            self.domain_id, len(self.adds), len(self.modifies),
+            len(self.removes))
+
+
+class ZoneReconciler(object):
+    def __init__(self, records, ignore_types=DEFAULT_IGNORE_TYPES,
+                 poller=None):
+        """
+        Bring the records of a domain to a desired state with the minimal
+        number of adds, modifies and removes.
+
+        :param records: rscloud.Records endpoint
+        :param ignore_types: record types never added, modified or removed
+        :param poller: rscloud.JobPoller used to wait on each batch of
+            changes
+        """
+        self._records = records
+        self.ignore_types = set(t.upper() for t in ignore_types)
+        if poller is None:
+            poller = JobPoller(records._sess)
+        self._poller = poller
+
+    def plan(self, domain_id, desired):
+        """
+        Compute the changes needed for domain_id to have exactly the desired
+        records.
+
+        :param domain_id: id of the domain
+        :param desired: list of record dicts, with name, type and data, and
+            optionally ttl, priority and comment
+        :returns: ChangeSet
+        """
+        changes = ChangeSet(domain_id)
+
+        current = {}
+        for rec in self._records.iter_records(domain_id):
+            if rec['type'].upper() not in self.ignore_types:
+                current.setdefault(_key(rec), []).append(rec)
+
+        unmatched = []
+        for rec in desired:
+            if rec['type'].upper() in self.ignore_types:
+                continue
+            matches = current.get(_key(rec))
+            if not matches:
+                unmatched.append(rec)
+                continue
+            existing = matches.pop(0)
+            changed = _changed_fields(existing, rec)
+            if changed:
+                changed.update(id=existing['id'], name=existing['name'],
+                               type=existing['type'])
+                changes.modifies.append(changed)
+
+        # Pair leftover records with the same name and type, so a changed
+        # value is a single modify rather than a remove and an add.
+        leftover = {}
+        for matches in current.values():
+            for rec in matches:
+                name_type = _key(rec)[:2]
+                leftover.setdefault(name_type, []).append(rec)
+
+        for rec in unmatched:
+            candidates = leftover.get(_key(rec)[:2])
+            if not candidates:
+                changes.adds.append(dict(rec))
+                continue
+            existing = candidates.pop(0)
+            changed = _changed_fields(existing, rec)
+            changed.update(id=existing['id'], name=existing['name'],
+                           type=existing['type'], data=rec['data'])
+            changes.modifies.append(changed)
+
+        for candidates in leftover.values():
+            changes.removes.extend(candidates)
+
+        return changes
+
+    def apply(self, changes, timeout=None):
+        """
+        Apply a ChangeSet. Removes, modifies and adds are each sent in
+        batches, and each step waits for its jobs before the next starts.
+        If any job of a step fails, the later steps aren't started and
+        RackspaceAPIError is raised.
+
+        :param changes: ChangeSet from plan()
+        :param timeout: seconds to wait for each step
+        :returns: the ChangeSet, with the started jobs in changes.jobs
+        """
+        domain_id = changes.domain_id
+        steps = [
+            (self._records.remove_many,
+             [rec['id'] for rec in changes.removes]),
+            (self._records.modify_many,
+             [dict((k, v) for k, v in rec.items() if k != 'type')
+              for rec in changes.modifies]),
+            (self._records.add_many, changes.adds),
+        ]
+        for method, records in steps:
+            if not records:
+                continue
+            jobs = self._poller.add(method(domain_id, records))
+            changes.jobs.extend(jobs)
+            self._poller.wait_all(jobs, timeout)
+            failed = [job for job in jobs if not job.ok]
+            if failed:
+                raise RackspaceAPIError(failed[0].error)
+        return changes
+
+    def sync(self, domain_id, desired, dry_run=False, timeout=None):
+        """
+        Plan and apply the changes for domain_id to have exactly the desired
+        records.
+
+        :param dry_run: only compute the changes, use
+            ChangeSet.describe() to show them
+        :returns: ChangeSet
+        """
+        changes = self.plan(domain_id, desired)
+        if dry_run or changes.empty:
+            return changes
+        return self.apply(changes, timeout)